@@ -26,7 +26,7 @@ bl_info = {
     "name": "Supcom Importer 0.5.3",
     "author": "dan & Brent & Oygron",
     "version": (0,5,3),
-    "blender": (2, 80, 0),
+    "blender": (3, 2, 0),
     "location": "File > Import-Export",
     "description": "Imports Supcom files",
     "warning": "",
@@ -52,7 +52,16 @@ from os import path
 
 import struct
 import string
+import re
 import math
+import mmap
+import zlib
+import zipfile
+import json
+import hashlib
+import fnmatch
+import threading
+import numpy as np
 from math import *
 from bpy_extras.io_utils import unpack_list, unpack_face_list
 
@@ -62,11 +71,15 @@ from struct import *
 from bpy.props import *
 
 from time import sleep
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 VERSION = '5.3'
 
 sca_filepath = [ "", "", "None"]
 scm_filepath = [ "", "", "None"]
+scm_import_options = { "custom_normals": True, "weld": False, "cache": False, "instance": False, "proxy": False, "materials": True, "lods": False }
+sca_import_options = { "decimate": False, "location_tolerance": 0.001, "rotation_tolerance": radians(0.1), "cache": False }
 ######################################################
 # User defined behaviour, Select as you need
 ######################################################
@@ -82,6 +95,13 @@ LOG_ENABLE = 0
 #Filename / Path. Default is blender directory Filename SC-E_LOG.txt
 LOG_FILENAME = "SC-E_LOG.txt"
 
+#how many animation frames are decoded at once when streaming an sca (the lesser the less memory)
+SCA_CHUNK_FRAMES = 64
+
+#largest size in MB of the parsed data cache (used when "Cache Parsed Data" is enabled in the import options)
+#the least recently used files are removed when it gets bigger
+PARSE_CACHE_SIZE = 512
+
 
 
 ######################################################
@@ -100,6 +120,14 @@ xz_to_xy_transform = Matrix(([ 1, 0, 0],
 globMesh = []
 MArmatureWorld = Matrix()
 
+def transform_points(points, matrix, translate = True):
+    # the same as Vector(point) @ matrix for every row of points, as one matrix product
+    matrix = np.array(matrix, dtype=np.float32)
+    result = points @ matrix[:3, :3]
+    if translate:
+        result += matrix[3, :3]
+    return result
+
 def my_popup(msg):
     def draw(self, context):
         self.layout.label(msg)
@@ -159,8 +187,466 @@ class OBJECT_OT_anim_replace_bone(bpy.types.Operator):
         check_bone(self.meshBones,self.anim,self.objBoneNames,self.bone_num + 1)
         return {'FINISHED'}
 
+######################################################
+# SCD archives
+######################################################
+# The game data is shipped in .scd files, which are zip archives. Files inside them are addressed as
+# the archive path followed by the path inside the archive, for instance
+# .../gamedata/units.scd/units/uel0001/uel0001_lod0.scm, and are read straight out of the archive.
+# Reading the central directory of a big archive is slow, so its index is kept on disk and
+# only read again when the size or modification time of the archive changes.
+
+scd_index_cache = {}
+scd_index_lock = threading.Lock()
+cache_root = None
+
+def find_cache_root():
+    # the folder for the importer caches in the blender user data. this calls bpy, so it is looked up on
+    # the main thread before the files are parsed, the workers only use cache_root
+    global cache_root
+    try:
+        cache_root = bpy.utils.user_resource('DATAFILES', path="supcom_importer", create=True)
+    except (OSError, ValueError):
+        cache_root = None
+
+def cache_directory(name):
+    # a folder for the importer caches, None if it cant be made
+    if cache_root == None:
+        return None
+    try:
+        folder = os.path.join(cache_root, name)
+        os.makedirs(folder, exist_ok=True)
+        return folder
+    except OSError:
+        return None
+
+def split_archive_path(filename):
+    # returns (archive, path inside the archive), or (None, None) for plain files
+    if '.scd' not in filename.lower():
+        return None, None
+
+    archive = filename
+    while True:
+        if archive.lower().endswith('.scd') and os.path.isfile(archive):
+            return archive, filename[len(archive):].replace('\\', '/').strip('/')
+        parent = os.path.dirname(archive)
+        if parent == archive or parent == '':
+            return None, None
+        archive = parent
+
+def read_scd_index(archive):
+    # name (lower case) -> (name, local header offset, compression, compressed size, size) for every member
+    index = {}
+    with zipfile.ZipFile(archive) as scd:
+        for info in scd.infolist():
+            if info.is_dir():
+                continue
+            index[info.filename.lower()] = (info.filename, info.header_offset, info.compress_type, info.compress_size, info.file_size)
+    return index
+
+def scd_index(archive):
+    archive = os.path.abspath(archive)
+    stat = os.stat(archive)
+    key = (stat.st_size, stat.st_mtime)
+
+    # the pool workers can ask for the same archive at once, it is only indexed by the first of them
+    with scd_index_lock:
+        cached = scd_index_cache.get(archive)
+        if cached != None and cached[0] == key:
+            return cached[1]
+
+        index = None
+        folder = cache_directory("scd_index")
+        if folder != None:
+            cachefile = os.path.join(folder, hashlib.sha1(archive.encode('utf-8')).hexdigest() + '.json')
+            try:
+                with open(cachefile, 'r') as f:
+                    stored = json.load(f)
+                if stored['size'] == stat.st_size and stored['mtime'] == stat.st_mtime:
+                    index = dict((entry[0].lower(), tuple(entry)) for entry in stored['members'])
+            except (OSError, ValueError, KeyError, TypeError):
+                index = None
+
+        if index == None:
+            print("indexing", archive)
+            index = read_scd_index(archive)
+            if folder != None:
+                try:
+                    tempfile = '%s.%d.tmp' % (cachefile, threading.get_ident())
+                    with open(tempfile, 'w') as f:
+                        json.dump({'size': stat.st_size, 'mtime': stat.st_mtime, 'members': list(index.values())}, f)
+                    os.replace(tempfile, cachefile)
+                except OSError as error:
+                    print("couldn't store the archive index:", error)
+
+        scd_index_cache[archive] = (key, index)
+        return index
+
+def read_archive_member(archive, member):
+    entry = scd_index(archive).get(member.lower())
+    if entry == None:
+        raise FileNotFoundError('%s is not in %s' % (member, archive))
+    name, offset, compression, compressed_size, size = entry
+
+    with open(archive, 'rb') as f:
+        f.seek(offset)
+        header = struct.unpack('<4s2B4HL2L2H', f.read(30)) #the local file header in front of the data
+        if header[0] != b'PK\003\004':
+            raise ValueError('bad local header for %s in %s' % (member, archive))
+        f.seek(offset + 30 + header[10] + header[11])
+        data = f.read(compressed_size)
+
+    if compression == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+    elif compression != zipfile.ZIP_STORED:
+        raise ValueError('unsupported compression %d for %s in %s' % (compression, member, archive))
+
+    if len(data) != size:
+        raise ValueError('%s in %s is damaged' % (member, archive))
+    return data
+
+def archive_members(archive, pattern, extension):
+    # the files in the archive with the given extension that match a wildcard pattern.
+    # patterns without a / are matched against the file name only
+    pattern = pattern.lower().replace('\\', '/')
+    if pattern == '':
+        return []
+
+    members = []
+    for key, entry in scd_index(archive).items():
+        if not key.endswith(extension):
+            continue
+        if fnmatch.fnmatchcase(key if '/' in pattern else key.rsplit('/', 1)[-1], pattern):
+            members.append(archive + '/' + entry[0])
+    return sorted(members)
+
+def expand_archive_files(filenames, pattern, extension):
+    # replaces every selected archive with the files in it that match the pattern
+    result = []
+    for filename in filenames:
+        if filename.lower().endswith('.scd') and os.path.isfile(filename):
+            result += archive_members(filename, pattern, extension)
+        else:
+            result.append(filename)
+    return result
+
+def file_signature(filename):
+    # size and modification time of a file. files inside an archive use the archive ones
+    archive, member = split_archive_path(filename)
+    stat = os.stat(archive if archive != None else filename)
+    return stat.st_size, stat.st_mtime
+
+
+######################################################
+# Parsed data cache
+######################################################
+# When enabled in the import options the decoded, axis converted arrays of a file are kept on disk
+# as an uncompressed npz, named after a hash of the file contents. Importing the same file again
+# loads the arrays instead of parsing it. Every hit touches the file, and the oldest files are
+# removed once the folder is bigger than PARSE_CACHE_SIZE.
+
+PARSE_CACHE_VERSION = 2 #raise this when the stored arrays change
+
+def content_hash(*buffers):
+    digest = hashlib.blake2b(digest_size=16)
+    for buffer in buffers:
+        digest.update(buffer)
+    return digest.hexdigest()
+
+def parse_cache_key(kind, digest):
+    return '%s%d_%s' % (kind, PARSE_CACHE_VERSION, digest)
+
+def parse_cache_load(key):
+    # the stored arrays by name, None when the file isnt cached
+    folder = cache_directory("parsed")
+    if folder == None:
+        return None
+
+    cachefile = os.path.join(folder, key + '.npz')
+    try:
+        with np.load(cachefile, allow_pickle=False) as data:
+            arrays = dict((name, data[name]) for name in data.files)
+        os.utime(cachefile)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    return arrays
+
+def parse_cache_store(key, arrays):
+    folder = cache_directory("parsed")
+    if folder == None:
+        return
+
+    cachefile = os.path.join(folder, key + '.npz')
+    tempfile = '%s.%d.tmp' % (cachefile, threading.get_ident())
+    try:
+        with open(tempfile, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tempfile, cachefile)
+    except OSError as error:
+        print("couldn't store the parsed data:", error)
+        return
+
+    parse_cache_evict(folder)
+
+def parse_cache_evict(folder):
+    # removes the least recently used files until the cache fits in PARSE_CACHE_SIZE
+    entries = []
+    for name in os.listdir(folder):
+        if name.endswith('.npz'):
+            try:
+                stat = os.stat(os.path.join(folder, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, name in sorted(entries):
+        if total <= PARSE_CACHE_SIZE * 1024 * 1024:
+            break
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass #another import got there first
+        total -= size
+
+
+######################################################
+# Memory mapped file readers
+######################################################
+# The readers only parse the fixed header when they are opened. Every section is handed out as a
+# memoryview into the mapped file the first time it is asked for, so nothing is copied or decoded
+# until a loader actually touches that section. Loaders must copy whatever they keep before the
+# reader is closed. Files inside an scd archive are unpacked into memory instead of being mapped.
+
+class supcom_reader :
+
+    headerstruct = ''
+
+    def __init__(self, filename):
+        self.filename = filename
+        archive, member = split_archive_path(filename)
+        if archive != None:
+            self.file = None
+            self.map = None
+            self.buffer = memoryview(read_archive_member(archive, member))
+        else:
+            self.file = open(filename, 'rb')
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: #empty files cant be mapped
+                self.file.close()
+                raise
+            self.buffer = memoryview(self.map)
+        self.sections = {}
+        try:
+            self.header = struct.unpack_from(self.headerstruct, self.buffer, 0)
+        except struct.error: #file is shorter than the header
+            self.close()
+            raise
+
+    def section_bounds(self, name):
+        raise KeyError(name)
+
+    def section(self, name):
+        view = self.sections.get(name)
+        if view is None:
+            start, end = self.section_bounds(name)
+            view = self.buffer[start:end]
+            self.sections[name] = view
+        return view
+
+    def close(self):
+        if self.buffer is None:
+            return
+        for view in self.sections.values():
+            view.release()
+        self.sections = {}
+        self.buffer.release()
+        self.buffer = None
+        if self.map != None:
+            self.map.close()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class scm_reader(supcom_reader) :
+
+    headerstruct = '<4s11I'
+
+    def __init__(self, filename):
+        supcom_reader.__init__(self, filename)
+        (self.marker,
+         self.version,
+         self.boneoffset,
+         self.bonecount,
+         self.vertoffset,
+         self.extravertoffset,
+         self.vertcount,
+         self.indexoffset,
+         self.indexcount,
+         self.infooffset,
+         self.infocount,
+         self.totalbonecount) = self.header
+        self.marker = self.marker.decode('ascii', 'replace')
+        self.tricount = self.indexcount // 3
+        self.read_layout()
+
+    def read_layout(self):
+        # version 7 (supcom 2) files have more header fields between the version 5 header and the NAME
+        # marker, and can store more data per vertex. for those the extra header words and the vertex
+        # stride are worked out from where the sections actually are. version 5 files always use the
+        # version 5 sizes
+        headersize = struct.calcsize(self.headerstruct)
+        header_end = max(headersize, self.boneoffset - 4)
+        names_marker = bytes(self.buffer[headersize:header_end]).find(b'NAME')
+        if names_marker == -1:
+            self.namesoffset = headersize + pad(headersize)
+            names_marker = self.namesoffset - 4
+        else:
+            names_marker += headersize
+            self.namesoffset = names_marker + 4
+
+        # the raw words in front of the NAME marker, without the padding. their meaning isnt known
+        self.extraheader = np.zeros(0, dtype='<u4')
+        if self.version != 5 and names_marker > headersize:
+            region = bytes(self.buffer[headersize:names_marker])
+            region = region[:len(region) // 4 * 4]
+            padding = region[-1:] * 4 #the padding repeats the byte in front of the marker
+            while len(region) and region[-4:] == padding:
+                region = region[:-4]
+            self.extraheader = np.frombuffer(region, dtype='<u4').copy()
+
+        self.vertstride = scm_vertex_dtype.itemsize
+        self.extravertsize = 0
+        if self.vertcount > 0:
+            if self.version != 5:
+                self.vertstride = self.vertex_stride()
+            if self.extravertoffset > 0:
+                self.extravertsize = (self.section_end(self.extravertoffset) - self.extravertoffset) // self.vertcount
+
+    def vertex_stride(self):
+        # the smallest vertex size that leaves nothing but padding behind the vertices. the padding is
+        # one repeated byte, which differs between exporters (0xC5, 'X'), so any single repeated byte counts
+        standard = scm_vertex_dtype.itemsize
+        available = self.section_end(self.vertoffset) - self.vertoffset
+        for stride in range(standard, available // self.vertcount + 1):
+            tail = bytes(self.buffer[self.vertoffset + stride * self.vertcount:self.vertoffset + available])
+            if tail.strip(tail[:1]) == b'':
+                return stride
+
+        # no size leaves clean padding, anything more than the padding is more vertex data
+        if available - self.vertcount * standard <= 32:
+            return standard
+        return available // self.vertcount
+
+    def section_end(self, offset):
+        # where the section starting at offset ends at the latest: at the marker of the next section
+        starts = [start - 4 for start in (self.boneoffset, self.vertoffset, self.extravertoffset, self.indexoffset, self.infooffset) if start > offset]
+        return min(starts + [len(self.buffer)])
+
+    def section_bounds(self, name):
+        if name == 'NAME':
+            # the names follow the padded header and run up to the SKEL marker
+            return self.namesoffset, self.boneoffset - 4
+        if name == 'SKEL':
+            return self.boneoffset, self.boneoffset + self.totalbonecount * struct.calcsize(scm_bone.bonestruct)
+        if name == 'VTXL':
+            return self.vertoffset, self.vertoffset + self.vertcount * self.vertstride
+        if name == 'EXTV':
+            return self.extravertoffset, self.extravertoffset + self.vertcount * self.extravertsize
+        if name == 'TRIS':
+            return self.indexoffset, self.indexoffset + self.tricount * 3 * 2
+        if name == 'INFO':
+            return self.infooffset, self.infooffset + self.infocount
+        raise KeyError(name)
+
+    @property
+    def names(self):
+        return self.section('NAME')
+
+    @property
+    def skel(self):
+        return self.section('SKEL')
+
+    @property
+    def vtxl(self):
+        return self.section('VTXL')
+
+    @property
+    def extv(self):
+        return self.section('EXTV')
+
+    @property
+    def tris(self):
+        return self.section('TRIS')
+
+    @property
+    def info(self):
+        return self.section('INFO')
+
+
+class sca_reader(supcom_reader) :
+
+    headerstruct = '<4siifiiiii'
+
+    def __init__(self, filename):
+        supcom_reader.__init__(self, filename)
+        (self.magic,
+         self.version,
+         self.numframes,
+         self.duration,
+         self.numbones,
+         self.namesoffset,
+         self.linksoffset,
+         self.animoffset,
+         self.framesize) = self.header
+        if self.framesize <= 0: #older exporters left the frame size empty
+            self.framesize = struct.calcsize(sca_frame.frameheader_fmt) + self.numbones * struct.calcsize(sca_bone.posrot_fmt)
+
+    def section_bounds(self, name):
+        if name == 'NAME':
+            return self.namesoffset, self.linksoffset
+        if name == 'LINK':
+            return self.linksoffset, self.linksoffset + self.numbones * 4
+        if name == 'DATA':
+            # the root bone pos/rot is written in front of the frames
+            return self.animoffset, self.animoffset + struct.calcsize(sca_bone.posrot_fmt) + self.numframes * self.framesize
+        raise KeyError(name)
+
+    @property
+    def names(self):
+        return self.section('NAME')
+
+    @property
+    def link(self):
+        return self.section('LINK')
+
+    @property
+    def data(self):
+        return self.section('DATA')
+
+    def iter_frames(self, chunksize):
+        # yields (first frame index, keytimes, keyflags, posrot) for every chunksize frames.
+        # each chunk is copied out of the map, so only one chunk is decoded at any time
+        posrot_size = struct.calcsize(sca_bone.posrot_fmt)
+        framedtype = sca_frame_dtype(self.numbones, self.framesize)
+
+        for start in range(0, self.numframes, chunksize):
+            count = min(chunksize, self.numframes - start)
+            frames = np.frombuffer(self.data, dtype=framedtype, count=count, offset=posrot_size + start * self.framesize)
+            chunk = (start, frames['keytime'].copy(), frames['keyflags'].copy(), frames['posrot'].copy())
+            del frames #dont hold on to the map while the caller works on the chunk
+            yield chunk
+
+
 class scm_bone :
 
+    bonestruct = '<16f3f4f4i'
     name = ""
     #rest_pose_inv = []
     rel_mat = Matrix()
@@ -203,11 +689,9 @@ class scm_bone :
 
 
 
-    def load(self, file):
+    def load(self, buffer, offset = 0):
         #global xy_to_xz_transform
-        bonestruct = '16f3f4f4l'
-        buffer = file.read(struct.calcsize(bonestruct))
-        readout = struct.unpack(bonestruct, buffer)
+        readout = struct.unpack_from(self.bonestruct, buffer, offset)
 
         #supcom information:
         readRPI = Matrix(([0,0,0,0],[0,0,0,0],[0,0,0,0],[0,0,0,0]))
@@ -257,123 +741,221 @@ class scm_bone :
         #for row in range(4):
             #print( '  ', self.rest_pose_inv[row])
 
-class scm_vertex :
-
-    position = []
-    tangent = []
-    normal = []
-    binormal = []
-    uv1 = []
-    uv2 = []
-    bone_index = []
-
-    def __init__(self):
-        self.position     = Vector((0,0,0))
-        self.tangent     = Vector((0,0,0))
-        self.normal     = Vector((0,0,0))
-        self.binormal     = Vector((0,0,0))
-        self.uv1     = Vector((0,0))
-        self.uv2     = Vector((0,0))
-        self.bone_index = [0]*4
-
-    def load(self, file):
-
-        vertstruct = '3f3f3f3f2f2f4B'
-        vertsize = struct.calcsize(vertstruct)
-
-        buffer = file.read(vertsize)
-        vertex = struct.unpack(vertstruct, buffer)
-
-        self.position = vertex[0:3]
-        self.tangent = vertex[3:6]
-        self.normal = vertex[6:9]
-        self.binormal = vertex[9:12]
-        self.uv1 = vertex[12:14]
-        self.uv2 = vertex[14:16]
-        self.bone_index = vertex[16:20]
-        return self
-
-    def dump(self):
-        print( 'position ', self.position)
-        print( 'tangent  ', self.tangent)
-        print( 'normal   ', self.normal)
-        print( 'binormal ', self.binormal)
-        print( 'uv1      ', self.uv1)
-        print( 'uv2      ', self.uv2)
-        print( 'bones    ', self.bone_index)
+class rest_bone_list(list) :
+    # The rest bones of an armature as returned by get_mesh_bones. On top of the plain list it keeps a
+    # name lookup and the rel_matrix_inv of every bone stacked into one array, so animations dont
+    # have to search the bones again for every frame.
+
+    def __init__(self, bones):
+        list.__init__(self, bones)
+        self.index = {}
+        for i, bone in enumerate(self):
+            self.index.setdefault(bone.name, i)
+        self.rel_matrix_inv = np.array([np.array(bone.rel_matrix_inv) for bone in self]).reshape(-1, 4, 4)
+
+    def find(self, name):
+        i = self.index.get(name)
+        if i == None:
+            return None
+        return self[i]
+
+    def matrix_inv_table(self, bonenames):
+        # rel_matrix_inv for each of the given names, bones that arent in the armature get the identity
+        table = np.tile(np.identity(4), (len(bonenames), 1, 1))
+        for b, name in enumerate(bonenames):
+            i = self.index.get(name)
+            if i != None:
+                table[b] = self.rel_matrix_inv[i]
+        return table
+
+
+# Layout of one SCM_Vertex in the VTXL section, '3f3f3f3f2f2f4B' in struct notation.
+# The whole section is decoded in one go into a structured array with one field per column.
+scm_vertex_dtype = np.dtype([
+    ('position',   '<f4', 3),
+    ('tangent',    '<f4', 3),
+    ('normal',     '<f4', 3),
+    ('binormal',   '<f4', 3),
+    ('uv1',        '<f4', 2),
+    ('uv2',        '<f4', 2),
+    ('bone_index', 'u1',  4),
+])
+
+def scm_vertex_layout(stride):
+    # the vertex dtype for a given vertex size. the bytes past the supcom 1 columns are kept in an 'extra' field
+    if stride <= scm_vertex_dtype.itemsize:
+        return scm_vertex_dtype
+    return np.dtype(scm_vertex_dtype.descr + [('extra', 'u1', stride - scm_vertex_dtype.itemsize)])
 
 
 class scm_mesh :
 
     bones = []
     vertices = []
+    positions = []
+    normals = []
     faces = []
     info = []
     filename = ""
+    source_hash = ""
+    bounds = None
+    bonenames = []
+    extra_header = []
+    extra_vertices = []
 
     def __init__(self):
         self.bones = []
         self.vertices = []
+        self.positions = []
+        self.normals = []
         self.faces = []
         self.info = []
         self.filename = ""
+        self.source_hash = ""
+        self.bounds = None
+        self.bonenames = []
+        self.extra_header = np.zeros(0, dtype=np.uint32)
+        self.extra_vertices = np.zeros((0, 0), dtype=np.uint8)
 
-    def load(self, filename):
-        global xy_to_xz_transform
+    def load(self, filename, cache = False, proxy = False, skeleton = True, source_hash = "", identify = False):
+        # with proxy = True only the bones and the bounding box of the vertices are read.
+        # with skeleton = False only the bone names are read, for meshes that use the bones of another scm.
+        # the file is only hashed for the cache or with identify, a hash that is already known can be passed in
         self.filename = filename
-        scm = open(filename, 'rb')
+        self.source_hash = source_hash
+
+        with scm_reader(filename) as scm:
+            # the proxy only keeps a hash that is passed in, so the whole file isnt read for it
+            if proxy:
+                if (self.load_header(scm) == None):
+                    return
+                self.load_bones(scm)
+                self.load_bounds(scm)
+                return self
+
+            if (cache or identify) and not self.source_hash:
+                self.source_hash = content_hash(scm.buffer)
+
+            cache = cache and skeleton
+            if cache:
+                key = parse_cache_key('scm', self.source_hash)
+                arrays = parse_cache_load(key)
+                if arrays != None:
+                    print("using the cached data of", filename)
+                    return self.load_arrays(arrays)
+
+            if (self.load_header(scm) == None):
+                return
+
+            if skeleton:
+                self.load_bones(scm)
+            else:
+                self.load_bone_names(scm)
+            self.load_vertices(scm)
+            self.load_faces(scm)
+            self.load_info(scm)
+
+        self.convert_axes()
+        if cache:
+            parse_cache_store(key, self.to_arrays())
 
-        # Read header
-        #headerstruct = '4s11L'
-        headerstruct = '4s11I'
-        buffer = scm.read(struct.calcsize(headerstruct))
-        header = struct.unpack(headerstruct, buffer)
+        return self
+
+    def convert_axes(self):
+        # the vertex positions and normals in blender coordinates
+        global xy_to_xz_transform
+        self.positions = transform_points(self.vertices['position'], xy_to_xz_transform)
+        self.normals = transform_points(self.vertices['normal'], xy_to_xz_transform, translate = False)
+
+    def to_arrays(self):
+        # everything load sets up, as plain arrays for the parsed data cache
+        return {
+            'vertices':            self.vertices,
+            'positions':           self.positions,
+            'normals':             self.normals,
+            'faces':               self.faces,
+            'info':                np.array(self.info, dtype=str),
+            'extra_header':        self.extra_header,
+            'extra_vertices':      self.extra_vertices,
+            'bonenames':           np.array([bone.name for bone in self.bones], dtype=str),
+            'bone_parent':         np.array([bone.parent_index for bone in self.bones], dtype=np.int32),
+            'bone_position':       np.array([tuple(bone.position) for bone in self.bones]).reshape(-1, 3),
+            'bone_rotation':       np.array([tuple(bone.rotation) for bone in self.bones]).reshape(-1, 4),
+            'bone_rel_mat':        np.array([np.array(bone.rel_mat) for bone in self.bones]).reshape(-1, 4, 4),
+            'bone_rel_mat_inv':    np.array([np.array(bone.rel_mat_inv) for bone in self.bones]).reshape(-1, 4, 4),
+            'bone_rel_matrix_inv': np.array([np.array(bone.rel_matrix_inv) for bone in self.bones]).reshape(-1, 4, 4),
+        }
+
+    def load_arrays(self, arrays):
+        # the reverse of to_arrays
+        self.vertices = arrays['vertices']
+        self.positions = arrays['positions']
+        self.normals = arrays['normals']
+        self.faces = arrays['faces']
+        self.info = [str(info) for info in arrays['info']]
+        self.bonenames = [str(name) for name in arrays['bonenames']]
+        self.extra_header = arrays['extra_header']
+        self.extra_vertices = arrays['extra_vertices']
+
+        self.bones = []
+        for b, name in enumerate(arrays['bonenames']):
+            bone = scm_bone(str(name), parent_index = int(arrays['bone_parent'][b]))
+            bone.position = Vector(arrays['bone_position'][b])
+            bone.rotation = Quaternion(arrays['bone_rotation'][b])
+            bone.rel_mat = Matrix(arrays['bone_rel_mat'][b].tolist())
+            bone.rel_mat_inv = Matrix(arrays['bone_rel_mat_inv'][b].tolist())
+            bone.rel_matrix_inv = Matrix(arrays['bone_rel_matrix_inv'][b].tolist())
+            self.bones.append(bone)
+
+        for bone in self.bones:
+            if (bone.parent_index != -1):
+                bone.parent = self.bones[bone.parent_index]
+            else:
+                bone.parent = 0
+
+        return self
 
-        #print("buffer",buffer)
-        for h in header:
+    def load_header(self, scm):
+        for h in scm.header:
             print(h)
 
-        marker = header[0].decode('ascii')
-        version = header[1]
-        boneoffset = header[2]
-        bonecount = header[3]
-        vertoffset = header[4]
-        extravertoffset = header[5]
-        vertcount = header[6]
-        indexoffset = header[7]
-        indexcount = header[8]
-        tricount = indexcount // 3 #?
-        infooffset = header[9]
-        infocount = header[10]
-        totalbonecount = header[11]
-        #note: this is for SCM version 5. For SCM Version 7 (supcom 2) there are additional things in the header that arent decoded here, for instance material information.
-
-        if (marker != 'MODL'):
-            print( 'Not a valid scm')
-            my_popup("Not a valid scm")
+        if (scm.marker != 'MODL'):
+            print( 'Not a valid scm') #the caller shows the error, this can run outside the main thread
             return
 
-        if (version != 5):
-            print('Unsupported SCM Version detected, attempting to import it regardless. SCM Version:',version)
+        # SCM Version 7 (supcom 2) has more header fields, for instance material information. Their meaning
+        # isnt documented, so they are kept as they are and stored with the imported mesh
+        self.extra_header = scm.extraheader
+        if len(self.extra_header):
+            print('extra header', self.extra_header.tolist())
+        if scm.vertstride != scm_vertex_dtype.itemsize:
+            print('vertex size', scm.vertstride)
 
-        # Read bone names
-        scm.seek(pad(scm.tell()), 1)
-        length = (boneoffset - 4) - scm.tell()
+        if (scm.version not in (5, 7)):
+            print('Unsupported SCM Version detected, attempting to import it regardless. SCM Version:',scm.version)
 
-        # This should probably be handeled by the scm_bone reader as it contains the nameoffset. But I'm lazy
-        # and logic tells me it's written in the same order as the bones.
-        buffer = scm.read(length)
-        rawnames = struct.unpack(str(length)+'s',buffer)
+        return self
 
-        b_bonenames = (rawnames[0].split(b'\0'))[:-1]
+    def load_bone_names(self, scm):
+        b_bonenames = (bytes(scm.names).split(b'\0'))[:-1]
 
-        bonenames = [b.decode() for b in b_bonenames]
-        print("bonenames",bonenames)
+        self.bonenames = [b.decode() for b in b_bonenames]
+        print("bonenames",self.bonenames)
+        return self.bonenames
+
+    def load_bones(self, scm):
+        global xy_to_xz_transform
+
+        # Read bone names
+        # This should probably be handeled by the scm_bone reader as it contains the nameoffset. But I'm lazy
+        # and logic tells me it's written in the same order as the bones.
+        bonenames = self.load_bone_names(scm)
         # Read bones
-        scm.seek(boneoffset, 0)
-        for b in range(0, totalbonecount):
+        skel = scm.skel
+        bonesize = struct.calcsize(scm_bone.bonestruct)
+        for b in range(0, scm.totalbonecount):
             bone = scm_bone(bonenames[b])
-            bone.load(scm)
+            bone.load(skel, b * bonesize)
             self.bones.append(bone)
 
         #show them (for debug)
@@ -396,49 +978,44 @@ class scm_mesh :
                 mrel = bone.rel_mat @ xy_to_xz_transform  #there is no parent
                 bone.rel_matrix_inv = Matrix(mrel).inverted()
 
-
-
+    def load_vertices(self, scm):
         # Read vertices
-        scm.seek(vertoffset, 0)
-        for b in range(0, vertcount):
-            vert = scm_vertex()
-            vert.load(scm)
-            self.vertices.append(vert)
+        self.vertices = np.frombuffer(scm.vtxl, dtype=scm_vertex_layout(scm.vertstride), count=scm.vertcount).copy()
 
         # Read extra vertex data
-        # Not implemented in Sup Com 1.0!
+        # Not used in Sup Com 1.0, its meaning isnt known so the bytes of every vertex are kept as they are
+        if scm.extravertsize > 0:
+            self.extra_vertices = np.frombuffer(scm.extv, dtype='u1').reshape(scm.vertcount, scm.extravertsize).copy()
 
+    def load_bounds(self, scm):
+        # the corners of the box around the vertices in blender coordinates, the vertices themselves arent kept
+        global xy_to_xz_transform
+        positions = np.frombuffer(scm.vtxl, dtype=scm_vertex_layout(scm.vertstride), count=scm.vertcount)['position']
+        if len(positions):
+            corners = transform_points(np.array([positions.min(axis=0), positions.max(axis=0)]), xy_to_xz_transform)
+            self.bounds = (corners.min(axis=0), corners.max(axis=0))
+        else:
+            self.bounds = (np.zeros(3), np.zeros(3))
+        del positions #dont hold on to the map
+
+    def load_faces(self, scm):
         # Read indices (triangles)
-        tristruct = '3h'
-        trisize = struct.calcsize(tristruct)
-
-        scm.seek(indexoffset, 0)
-        for t in range(tricount):
-            buffer = scm.read(trisize)
-            face = list(struct.unpack(tristruct, buffer))
-            for v in range(len(face)):
-                if face[v] < 0:
-                    face[v] = face[v] + 32768*2 #supcom doesnt mind storing negative vertex indices due to overflow in the face data, but blender crashes
-                if face[v] < 0: #incase of some other insanity we dont know about yet
-                    print('face vertex index below 0, setting to 0 to avoid crash: ',face[v])
-                    face[v] = 0
-                    
-            self.faces.append(face+[0])
+        # supcom stores the indices as unsigned shorts, reading them as signed made big meshes wrap around to negative indices
+        faces = np.frombuffer(scm.tris, dtype='<u2', count=scm.tricount * 3).reshape(scm.tricount, 3).copy()
 
+        badindices = faces >= scm.vertcount
+        if badindices.any(): #incase of some other insanity we dont know about yet
+            print('face vertex index out of range, setting to 0 to avoid crash: ', faces[badindices])
+            faces[badindices] = 0
 
+        self.faces = faces
+
+    def load_info(self, scm):
         # Read info
-        
-        if (infocount > 0):
-            scm.seek(infooffset)
-            buffer = scm.read(infocount)
-            rawinfo = struct.unpack(str(len(buffer))+'s',buffer)
-            b_info = rawinfo[0].split(b'\0')[:-1]
+        if (scm.infocount > 0):
+            b_info = bytes(scm.info).split(b'\0')[:-1]
             self.info = [b.decode("utf-8", "ignore") for b in b_info]
 
-        scm.close()
-
-        return self
-
     def dump(self):
         print( '')
         print( 'Filename: ', self.filename)
@@ -454,6 +1031,7 @@ class scm_mesh :
 
 class sca_bone:
 
+    posrot_fmt = '<3f4f'
     name = ''
     position = []
     rotation = []
@@ -479,8 +1057,20 @@ class sca_bone:
 
 
 
+# Layout of one frame in the DATA section: the 'fi' frame header followed by a '3f4f' pos/rot for every bone.
+# framesize comes from the file header, so any trailing bytes in a frame are skipped over.
+def sca_frame_dtype(numbones, framesize):
+    return np.dtype({
+        'names':    ['keytime', 'keyflags', 'posrot'],
+        'formats':  ['<f4', '<i4', ('<f4', (numbones, 7))],
+        'offsets':  [0, 4, 8],
+        'itemsize': framesize,
+    })
+
+
 class sca_frame:
 
+    frameheader_fmt = '<fi'
     keytime = 0.0
     keyflags = 0
     bones = []
@@ -492,20 +1082,13 @@ class sca_frame:
         self.bones = []
         self.anim = anim
 
-    def load(self, file,bonenames):
-        frameheader_fmt = 'fi'
-        frameheader_size = struct.calcsize(frameheader_fmt)
-        buffer = file.read(frameheader_size)
-
-        (self.keytime, self.keyflags) = struct.unpack(frameheader_fmt, buffer)
-
-        posrot_fmt = '3f4f'
-        posrot_size = struct.calcsize(posrot_fmt)
+    def load(self, keytime, keyflags, posrot, bonenames):
+        # the bones are views into the decoded pos/rot array of the frame, nothing is copied
+        self.keytime = float(keytime)
+        self.keyflags = int(keyflags)
 
         for b in range (0, self.anim.numbones) :
-            buffer = file.read(posrot_size)
-            posrot = struct.unpack(posrot_fmt, buffer)
-            bone = sca_bone(posrot[0:3], posrot[3:7],bonenames[b])
+            bone = sca_bone(posrot[b, 0:3], posrot[b, 3:7],bonenames[b])
             self.bones.append(bone)
 
     def dump(self):
@@ -514,171 +1097,184 @@ class sca_frame:
 
 
 
+# Batched versions of Quaternion.to_matrix() and Matrix.to_quaternion(), working on whole arrays of
+# quaternions (w, x, y, z) and 3x3 rotation matrices at once.
+
+def quaternion_to_matrix_array(quats):
+    # same formula as mathutils, so non unit quaternions give the same (scaled) matrices
+    q = quats * sqrt(2.0)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    mats = np.empty(quats.shape[:-1] + (3, 3), dtype=quats.dtype)
+    mats[..., 0, 0] = 1.0 - y*y - z*z
+    mats[..., 0, 1] = x*y - w*z
+    mats[..., 0, 2] = x*z + w*y
+    mats[..., 1, 0] = x*y + w*z
+    mats[..., 1, 1] = 1.0 - x*x - z*z
+    mats[..., 1, 2] = y*z - w*x
+    mats[..., 2, 0] = x*z - w*y
+    mats[..., 2, 1] = y*z + w*x
+    mats[..., 2, 2] = 1.0 - x*x - y*y
+    return mats
+
+def matrix_to_quaternion_array(mats):
+    # like mathutils the scale is removed first and the result always has w >= 0
+    mats = mats / np.maximum(np.linalg.norm(mats, axis=-2, keepdims=True), 1e-12)
+    m00, m01, m02 = mats[..., 0, 0], mats[..., 0, 1], mats[..., 0, 2]
+    m10, m11, m12 = mats[..., 1, 0], mats[..., 1, 1], mats[..., 1, 2]
+    m20, m21, m22 = mats[..., 2, 0], mats[..., 2, 1], mats[..., 2, 2]
+
+    # build the quaternion from whichever of w, x, y, z is largest, that is the numerically stable choice
+    sq = np.stack((1.0 + m00 + m11 + m22,
+                   1.0 + m00 - m11 - m22,
+                   1.0 - m00 + m11 - m22,
+                   1.0 - m00 - m11 + m22), axis=-1)
+    s = 2.0 * np.sqrt(np.maximum(sq, 1e-12))
+    candidates = np.stack((
+        np.stack((s[..., 0] / 4, (m21 - m12) / s[..., 0], (m02 - m20) / s[..., 0], (m10 - m01) / s[..., 0]), axis=-1),
+        np.stack(((m21 - m12) / s[..., 1], s[..., 1] / 4, (m01 + m10) / s[..., 1], (m02 + m20) / s[..., 1]), axis=-1),
+        np.stack(((m02 - m20) / s[..., 2], (m01 + m10) / s[..., 2], s[..., 2] / 4, (m12 + m21) / s[..., 2]), axis=-1),
+        np.stack(((m10 - m01) / s[..., 3], (m02 + m20) / s[..., 3], (m12 + m21) / s[..., 3], s[..., 3] / 4), axis=-1),
+    ), axis=-2)
+    best = np.argmax(sq, axis=-1)[..., None, None]
+    quats = np.take_along_axis(candidates, best, axis=-2)[..., 0, :]
+
+    quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+    quats[quats[..., 0] < 0] *= -1
+    return quats
+
+
 class sca_anim :
 
     filename = ""
-    frames = []
     bones = []
     bonelinks = []
     bonenames = []
     numbones = 0
+    numframes = 0
     duration = 0.0
+    keytimes = []
+    keyflags = []
+    posrot = []
 
     def __init__(self):
         self.filename = ""
-        self.frames = []
         self.bones = []
         self.numbones = 0
+        self.numframes = 0
         self.bonelinks = []
         self.bonenames = []
         self.duration = 0.0
-
-
-
-
-    def calcAnimBoneMatrix(self, frame, bone_index, armature_bones, frame_index):
+        self.keytimes = np.zeros(0, dtype=np.float32)
+        self.keyflags = np.zeros(0, dtype=np.int32)
+        self.posrot = np.zeros((0, 0, 7), dtype=np.float32) #frames x bones x (pos xyz, rot wxyz)
+        self._frames = None
+
+    @property
+    def frames(self):
+        # sca_frame/sca_bone objects are only built if something still asks for them
+        if self._frames is None:
+            self._frames = []
+            for f in range(len(self.posrot)):
+                frame = sca_frame(self)
+                frame.load(self.keytimes[f], self.keyflags[f], self.posrot[f], self.bonenames)
+                self._frames.append(frame)
+        return self._frames
+
+
+
+    def calcAnimPoseArrays(self, posrot, rest_matrix_inv):
+        # the pose of every frame and bone at once.
+        # posrot is a frames x bones x 7 array as read from the file, rest_matrix_inv holds the
+        # rel_matrix_inv of the rest bone matching each animation bone (bones x 4 x 4).
+        # returns the pose locations (frames x bones x 3) and rotations (frames x bones x 4)
         global xy_to_xz_transform
 
-        bone = frame.bones[bone_index];
-        
-        parent_index = self.bonelinks[bone_index]
-
-        # note that the pos/rot of the armature_bones are still in relative supcom coordinates.
-        # so we can correct the relative pos-increase by the relative armature-increase
-        pose_rel_pos = Vector(bone.position)
-        pose_rel_rot = Quaternion(bone.rotation)
-
-
-
-        # the matrix representation... it's easier to work with matrix notation I think.
-        # the rotation:
-
-        pose_rel_matrix = pose_rel_rot.to_matrix()
+        posrot = np.asarray(posrot, dtype=np.float64)
 
-        pose_rel_matrix.resize_4x4()
+        # row major matrices: transposed rotation, translation in the last row
+        pose_rel_matrix = np.zeros(posrot.shape[:-1] + (4, 4))
+        pose_rel_matrix[..., :3, :3] = np.swapaxes(quaternion_to_matrix_array(posrot[..., 3:7]), -1, -2)
+        pose_rel_matrix[..., 3, :3] = posrot[..., 0:3]
+        pose_rel_matrix[..., 3, 3] = 1.0
 
-        pose_rel_matrix.transpose()
+        # the root bones are rotated into the blender coordinates, the children are relative to their parents
+        roots = np.asarray(self.bonelinks) == -1
+        pose_rel_matrix[:, roots] = pose_rel_matrix[:, roots] @ np.array(xy_to_xz_transform)
 
-        # the translation:
-        pose_rel_matrix.transpose()
-        pose_rel_matrix.translation = pose_rel_pos
-        pose_rel_matrix.transpose()
+        pose_matrix = pose_rel_matrix @ np.asarray(rest_matrix_inv, dtype=np.float64)
 
-        #if frame_index == 0 or frame_index == 40:
-        #    print ('pose_rel1\n',pose_rel_matrix)
+        pose_pos = pose_matrix[..., 3, :3]
+        pose_rot = matrix_to_quaternion_array(np.swapaxes(pose_matrix[..., :3, :3], -1, -2))
+        return pose_pos, pose_rot
 
 
-        if (parent_index == -1) :
-            # for the root bone, this is already the absolution pos/rot, but,
-            # the root bone should be rotated into the blender coordinates
-            bone.rel_matrix = pose_rel_matrix @ xy_to_xz_transform
+    def load(self, filename, frames = True):
+        # with frames = False only the header and bones are read, the frames can then be streamed with iter_frames
+        self.filename = filename
 
-            #testmat =(bone.rel_mat) * Matrix(bone.parent.rel_mat).invert()
+        with sca_reader(filename) as sca:
+            if (self.load_header(sca) == None):
+                return
 
-        if (parent_index >= 0):
-            # for all the children, they are seen relative to the parents.
-            bone.rel_matrix = pose_rel_matrix
+            self.load_bones(sca)
+            if frames:
+                self.load_frames(sca)
 
-        # the (rendered) animation positions are relative to
-        # both the parent, and to the relative rest position of the bone.
-        #rechercher avec le nom, ici on a juste l'index, qui diffèrent entre le fichier de mesh et l'animation OK
-        restBone = None
-        for rBone in armature_bones:
-            #print ("name",rBone.name)
-            if rBone.name == bone.name:
-                restBone = rBone
-                break
-        
-        if (restBone == None):
-            my_popup(bone.name + " not found")
-            print(bone.name + " not found")
-            #return
-        
-        #bone.pose_matrix = Matrix(bone.rel_matrix * armature_bones[bone_index].rel_matrix_inv)#* xy_to_xz_transform)
-        #print ("bone.rel_matrix",bone.rel_matrix)
-        #print ("restBone.rel_matrix_inv",restBone.rel_matrix_inv)
-        bone.pose_matrix = Matrix(bone.rel_matrix @ restBone.rel_matrix_inv)#* xy_to_xz_transform)
-
-        # pose position relative to the armature
-        bone.pose_matrix.transpose()
-        bone.pose_pos = Vector(bone.pose_matrix.translation)
-
-        bone.pose_rot = bone.pose_matrix.to_quaternion()
-        #if frame_index == 0 or frame_index == 40:
-        #    print ('rel\n',bone.rel_matrix)
-        #    print ('inv\n',armature_bones[bone_index].rel_matrix_inv)
-        #    print ('mat\n',bone.pose_matrix)
-        #    print ("posInit",bone.position)
-        #    print ("rotInit",bone.rotation)
-        #    print ("posf",bone.pose_pos)
-        #    print ("rotf",bone.pose_rot)
-        
-        
-        #frame.bones[bone_index] = bone;
+        return self
 
+    def load_header(self, sca):
+        print('header', sca.header)
+        self.duration = sca.duration
+        self.numbones = sca.numbones
+        self.numframes = sca.numframes
 
-    def load(self, filename):
-        self.filename = filename
-        sca = open(filename, 'rb')
-
-        # Read header
-        headerstruct = '4siifiiiii'
-        buffer = sca.read(struct.calcsize(headerstruct))
-        header = struct.unpack(headerstruct, buffer)
-        print('header', header)
-        (magic,             \
-         version,           \
-         numframes,         \
-         self.duration,     \
-         self.numbones,     \
-         namesoffset,       \
-         linksoffset,       \
-         animoffset,        \
-         framesize) = struct.unpack(headerstruct, buffer)
-        if (magic != b'ANIM'):
-            print( 'Not a valid .sca animation file')
-            my_popup('Not a valid .sca animation file')
+        if (sca.magic != b'ANIM'):
+            print( 'Not a valid .sca animation file') #the caller shows the error, this can run outside the main thread
             return
 
-        if (version != 5):
-            print( 'Unsupported sca version: %d'  % version)
+        if (sca.version != 5):
+            print( 'Unsupported sca version: %d'  % sca.version)
+
+        return self
 
+    def load_bones(self, sca):
         # Read bone names
-        sca.seek(namesoffset, 0)
-        length = linksoffset - namesoffset
-        buffer = sca.read(length)
-        rawnames = struct.unpack(str(length)+'s',buffer)
-        b_bonenames = rawnames[0].split(b'\0')[:-1]
+        b_bonenames = bytes(sca.names).split(b'\0')[:-1]
         self.bonenames = [b.decode() for b in b_bonenames]
 
-
         # Read links
-        links_fmt = str(self.numbones)+'i'
-        links_size = struct.calcsize(links_fmt)
-
-        buffer = sca.read(links_size)
-        self.bonelinks = struct.unpack(links_fmt, buffer)
-
-        posrot_fmt = '3f4f'
-        posrot_size = struct.calcsize(posrot_fmt)
-
-        sca.seek(animoffset)
-        buffer = sca.read(posrot_size)
-        root_posrot = struct.unpack(posrot_fmt, buffer)
-
-        for f in range (0, numframes) :
-            frame = sca_frame(self)
-            frame.load(sca , self.bonenames)
-            self.frames.append(frame)
-
-        sca.close()
+        self.bonelinks = struct.unpack_from('<'+str(self.numbones)+'i', sca.link)
+
+    def load_frames(self, sca):
+        posrot_size = struct.calcsize(sca_bone.posrot_fmt)
+
+        root_posrot = struct.unpack_from(sca_bone.posrot_fmt, sca.data, 0)
+
+        # decode every frame at once, the pos/rot of all bones end up in one contiguous array
+        frames = np.frombuffer(sca.data, dtype=sca_frame_dtype(self.numbones, sca.framesize), count=sca.numframes, offset=posrot_size)
+        self.keytimes = frames['keytime'].copy()
+        self.keyflags = frames['keyflags'].copy()
+        self.posrot = frames['posrot'].copy()
+        self._frames = None
+
+    def iter_frames(self, chunksize = SCA_CHUNK_FRAMES):
+        # yields (first frame index, keytimes, keyflags, posrot) in chunks of chunksize frames
+        if len(self.posrot):
+            for start in range(0, len(self.posrot), chunksize):
+                end = start + chunksize
+                yield start, self.keytimes[start:end], self.keyflags[start:end], self.posrot[start:end]
+            return
 
-        return self
+        # the frames were not loaded, stream them from the file instead
+        with sca_reader(self.filename) as sca:
+            for chunk in sca.iter_frames(chunksize):
+                yield chunk
 
     def dump(self):
         print( 'SCA:  ', self.filename)
         print( 'Duration: %fs' % self.duration)
-        print( 'Num loaded frames ', len(self.frames))
+        print( 'Num loaded frames ', len(self.posrot))
 
         print( 'Bonelinks')
         for link in self.bonelinks:
@@ -699,158 +1295,730 @@ def pad(size):
 
 
 #**************************************************************************************************
-# Blender Interface
+# Header inspection
 #**************************************************************************************************
+# These only read the fixed header and the bone name table, so they are cheap enough to run on
+# thousands of files or on every redraw of the file browser.
+
+def peek_scm(filename):
+    with scm_reader(filename) as scm:
+        if (scm.marker != 'MODL'):
+            return None
+
+        return {
+            'version':   scm.version,
+            'bones':     scm.totalbonecount,
+            'vertices':  scm.vertcount,
+            'triangles': scm.tricount,
+            'bonenames': [b.decode("utf-8", "ignore") for b in bytes(scm.names).split(b'\0')[:-1]],
+        }
+
+def peek_sca(filename):
+    with sca_reader(filename) as sca:
+        if (sca.magic != b'ANIM'):
+            return None
+
+        return {
+            'version':   sca.version,
+            'bones':     sca.numbones,
+            'frames':    sca.numframes,
+            'duration':  sca.duration,
+            'bonenames': [b.decode("utf-8", "ignore") for b in bytes(sca.names).split(b'\0')[:-1]],
+        }
+
+peek_cache = {}
+
+def peek_file(filename):
+    # cached by path, size and modification time, returns None for anything that isnt a readable scm/sca
+    try:
+        key = (filename,) + file_signature(filename)
+    except OSError:
+        return None
+
+    if key not in peek_cache:
+        if len(peek_cache) > 256:
+            peek_cache.clear()
+        try:
+            if filename.lower().endswith(".scm"):
+                peek_cache[key] = peek_scm(filename)
+            elif filename.lower().endswith(".sca"):
+                peek_cache[key] = peek_sca(filename)
+            else:
+                peek_cache[key] = None
+        except (ValueError, struct.error, OSError):
+            peek_cache[key] = None
+    return peek_cache[key]
+
+def draw_archive_pattern(layout, operator, extension):
+    # the archive pattern is only shown while an scd is selected, with how many files it picks
+    filename = operator.filepath
+    if not (filename.lower().endswith('.scd') and os.path.isfile(filename)):
+        return
 
-def read_scm() :
-    global xy_to_xz_transform
-    global scm_filepath # [0] both [1] path [2] name
-    global sca_filepath # [0] both [1] path [2] name
-
-    print( "=== LOADING Sup Com Model ===")
-    print( "")
-    scene = bpy.context.scene
-    layer = bpy.context.view_layer
-    mesh = scm_mesh()
+    layout.prop(operator, "archive_pattern")
+    try:
+        count = len(archive_members(filename, operator.archive_pattern, extension))
+    except (OSError, ValueError, zipfile.BadZipFile):
+        layout.label(text="Not a readable archive", icon='ERROR')
+        return
+    layout.label(text="%d files match" % count)
 
-    if (mesh.load(scm_filepath[0]) == None):
-        print( 'Failed to load %s' %scm_filepath[2])
-        my_popup( 'Failed to load %s' %scm_filepath[2])
+def draw_file_stats(layout, filename):
+    stats = peek_file(filename)
+    if stats == None:
         return
 
-    #ProgBarLSCM = ProgressBar( "Imp: load SCM", (2*len(mesh.vertices) + len(mesh.faces)))
+    box = layout.box()
+    box.label(text="Version %d" % stats['version'])
+    if 'vertices' in stats:
+        box.label(text="Vertices: %d" % stats['vertices'])
+        box.label(text="Triangles: %d" % stats['triangles'])
+    else:
+        box.label(text="Frames: %d" % stats['frames'])
+        box.label(text="Duration: %.2fs" % stats['duration'])
+    box.label(text="Bones: %d" % stats['bones'])
 
-    armature_name = scm_filepath[2].rstrip(".scm")
-    print( "armature ", armature_name)
 
-    ###        CREATE ARMATURE
+#**************************************************************************************************
+# Blender Interface
+#**************************************************************************************************
+
+@contextmanager
+def armature_edit_session(armObj):
+    # edit bones only exist while the armature is in edit mode. The mode switch runs with a context override,
+    # so it doesnt depend on the selection or the editor the import is started from.
+    bpy.context.view_layer.objects.active = armObj
+    with bpy.context.temp_override(active_object=armObj, object=armObj, selected_objects=[armObj], selected_editable_objects=[armObj]):
+        bpy.ops.object.mode_set(mode='EDIT')
+        try:
+            yield armObj.data.edit_bones
+        finally:
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+def create_scm_armature(mesh, armature_name, collection):
+    global xy_to_xz_transform
+
     armData = bpy.data.armatures.new(armature_name)
     armData.show_axes = True
 
     armObj = bpy.data.objects.new(armature_name, armData)
+    collection.objects.link(armObj)
 
-    scene.collection.objects.link(armObj)
-    layer.objects.active = armObj
-    #if not armObj.select_get():
-    armObj.select_set(True)
-
-    bpy.ops.object.mode_set(mode='EDIT')
-
-    for index in range(len(mesh.bones)):
-        bone = mesh.bones[index]
-
-        blender_bone = armData.edit_bones.new(bone.name)
-        
-        #not nice parent may not exist,  but usualy should exist (depends on storing in scm)
-        if (bone.parent != 0) :
-            blender_bone.parent = armData.edit_bones[bone.parent.name]
-
-
-        t_matrix = bone.rel_mat @ xy_to_xz_transform
-        loc,rot,sca = t_matrix.transposed().decompose()
-        blender_bone.head = loc
-        blender_bone.tail = (rot.to_matrix() @ Vector((0,1,0))) + blender_bone.head
-        blender_bone.matrix = t_matrix.transposed()
+    with armature_edit_session(armObj) as edit_bones:
+        for index in range(len(mesh.bones)):
+            bone = mesh.bones[index]
 
+            blender_bone = edit_bones.new(bone.name)
+            
+            #not nice parent may not exist,  but usualy should exist (depends on storing in scm)
+            if (bone.parent != 0) :
+                blender_bone.parent = edit_bones[bone.parent.name]
+
+
+            t_matrix = bone.rel_mat @ xy_to_xz_transform
+            loc,rot,sca = t_matrix.transposed().decompose()
+            blender_bone.head = loc
+            blender_bone.tail = (rot.to_matrix() @ Vector((0,1,0))) + blender_bone.head
+            blender_bone.matrix = t_matrix.transposed()
+
+    return armObj
+
+def weld_vertices(positions, bones):
+    # merges vertices with exactly the same position and the same bone. parts that move on their own often
+    # touch at the same positions, those stay apart so each keeps its bone.
+    # Returns the scm vertex each welded vertex is taken from (in the original order), and the welded index of every scm vertex
+    rows = np.column_stack((positions.astype(np.float64), bones))
+    unique_rows, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.ravel()]
+
+def find_sharp_edges(faces, welded_faces, normals):
+    # an edge is sharp when the faces on either side of it used to have their own copies of its vertices,
+    # with different normals. splits that only separate uvs stay smooth.
+    # returns the sharp edges as (welded vertex a, welded vertex b) pairs with a < b
+    corners = np.array([[0, 1], [1, 2], [2, 0]])
+    welded_edges = welded_faces[:, corners].reshape(-1, 2)
+    scm_edges = faces[:, corners].reshape(-1, 2)
+
+    # put every edge in welded index order, keeping its scm vertices in the same order
+    flip = welded_edges[:, 0] > welded_edges[:, 1]
+    welded_edges = np.where(flip[:, None], welded_edges[:, ::-1], welded_edges)
+    scm_edges = np.where(flip[:, None], scm_edges[:, ::-1], scm_edges)
+    edge_normals = normals[scm_edges].reshape(-1, 6)
+
+    # compare the normals of every face edge to the first face edge on the same welded edge
+    order = np.lexsort((welded_edges[:, 1], welded_edges[:, 0]))
+    welded_edges = welded_edges[order]
+    edge_normals = edge_normals[order]
+    starts = np.flatnonzero(np.concatenate(([True], (welded_edges[1:] != welded_edges[:-1]).any(axis=1))))
+    first_normals = np.repeat(edge_normals[starts], np.diff(np.append(starts, len(order))), axis=0)
+    differs = np.abs(edge_normals - first_normals).max(axis=1) > 1e-4
+    sharp = np.logical_or.reduceat(differs, starts)
+    return welded_edges[starts[sharp]]
+
+def create_scm_mesh_data(mesh):
+    # returns the mesh datablock, and for every blender vertex the index of the scm vertex it was made from
+    global xy_to_xz_transform
 
-    bpy.ops.object.mode_set(mode='OBJECT')
-    
-    
     meshData = bpy.data.meshes.new('Mesh')
 
 
-    #add verts
-    vertlist = []
-    for vert in mesh.vertices:
-        vertlist.append(Vector(vert.position)@xy_to_xz_transform)
+    #add verts, rotated into the blender coordinates all at once
+    vertlist = mesh.positions
+    normals = mesh.normals
+
+    scm_faces = mesh.faces
+    faces = scm_faces
+    vertex_indices = np.arange(len(vertlist))
+    if scm_import_options["weld"]:
+        # supcom stores hard edges and uv seams as duplicated vertices, merge them back together
+        vertex_indices, welded_index = weld_vertices(vertlist, mesh.vertices['bone_index'][:, 0])
+        print("welded %d vertices into %d" % (len(vertlist), len(vertex_indices)))
+        vertlist = vertlist[vertex_indices]
+        faces = welded_index[scm_faces]
+
+        # triangles with two corners at the same position collapse when welded, they are left out.
+        # the scm faces are filtered the same way so the per loop uvs and normals stay in line
+        valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+        if not valid.all():
+            print("dropped %d triangles that collapsed when welding" % (len(faces) - valid.sum()))
+            faces = faces[valid]
+            scm_faces = scm_faces[valid]
 
     meshData.calc_loop_triangles()
     
     meshData.vertices.add(len(vertlist))
-    meshData.polygons.add(len(mesh.faces))
-    meshData.vertices.foreach_set("co", unpack_list(vertlist))
+    meshData.polygons.add(len(faces))
+    meshData.vertices.foreach_set("co", vertlist.ravel())
     
-    faces_loop_start = []
-    lidx = 0
-    for f in mesh.faces:
-        nbr_vidx = 3
-        faces_loop_start.append(lidx)
-        lidx += nbr_vidx
-    
-    
-    n = len(vertlist)
-    num_polys = len(mesh.faces)
+    num_polys = len(faces)
     meshData.loops.add(num_polys * 3)
-    meshData.polygons.foreach_set("loop_start", faces_loop_start)
-    meshData.polygons.foreach_set("loop_total", (3,) * num_polys)
+    meshData.polygons.foreach_set("loop_start", np.arange(0, num_polys * 3, 3, dtype=np.int32))
+    meshData.polygons.foreach_set("loop_total", np.full(num_polys, 3, dtype=np.int32))
     
-    #take the vertex data from the faces and put them into one long list
-    faceVertexOrderedList = []
-    for f in mesh.faces:
-        for faceVertex in range(3):
-            faceVertexOrderedList.append(f[faceVertex])
-    meshData.polygons.foreach_set("vertices", faceVertexOrderedList)
+    #the triangle indices are already one long list of face vertices
+    meshData.polygons.foreach_set("vertices", faces.ravel().astype(np.int32))
 
 
-    meshData.uv_layers.new(name='UVMap')
-    
-    #put all the vertex UVs into one long list
-    uvVertexList = []
-    for polygon in meshData.polygons:
-        for vertid in polygon.vertices:
-            uvVertexList.append(mesh.vertices[vertid].uv1[0])
-            uvVertexList.append(1.0-mesh.vertices[vertid].uv1[1])
-            
-    for uv in meshData.uv_layers: # uv texture
-        uv.data.foreach_set('uv', uvVertexList)
-
+    #the uvs are stored per vertex, blender wants them per loop. the loops are in triangle index order,
+    #so gathering the uv columns with the index array gives the whole layer at once. V is flipped for blender.
+    #this uses the scm vertices, so welding doesnt lose any uvs
+    loop_vertices = scm_faces.ravel()
+    for name, column in (('UVMap', 'uv1'), ('UVMap2', 'uv2')):
+        uvVertexList = mesh.vertices[column][loop_vertices]
+        uvVertexList[:, 1] = 1.0 - uvVertexList[:, 1]
+        meshData.uv_layers.new(name=name).data.foreach_set('uv', uvVertexList.ravel())
 
-    mesh_obj = bpy.data.objects.new('Mesh', meshData)
-    scene.collection.objects.link(mesh_obj)
-    layer.objects.active = mesh_obj
-    mesh_obj.select_set(True)
-    
     meshData.update() #blender crashes when going into edit mode without these
 
+    if scm_import_options["weld"]:
+        sharp_edges = find_sharp_edges(scm_faces, faces, normals)
+        edges = np.zeros(len(meshData.edges) * 2, dtype=np.int32)
+        meshData.edges.foreach_get("vertices", edges)
+        edges = np.sort(edges.reshape(-1, 2), axis=1).astype(np.int64)
+        edge_keys = edges[:, 0] * len(vertlist) + edges[:, 1]
+        sharp_keys = sharp_edges[:, 0].astype(np.int64) * len(vertlist) + sharp_edges[:, 1]
+        meshData.edges.foreach_set("use_edge_sharp", np.isin(edge_keys, sharp_keys))
+
+    if scm_import_options["custom_normals"]:
+        set_custom_normals(meshData, normals[loop_vertices])
+
+    if scm_import_options["materials"]:
+        material = scm_material(mesh.filename)
+        if material != None:
+            meshData.materials.append(material)
+
+    return meshData, vertex_indices
+
+# the textures of a unit are found next to the scm by their name, for uel0001_lod0.scm these are
+# uel0001_Albedo.dds, uel0001_SpecTeam.dds and uel0001_NormalsTS.dds. lods with their own textures
+# (uel0001_lod1_Albedo.dds) use those first.
+scm_texture_suffixes = (('albedo', '_albedo.dds'), ('specteam', '_specteam.dds'), ('normals', '_normalsts.dds'))
+
+def find_scm_textures(filename):
+    # kind -> path of the textures found for the model, the names are matched without case
+    archive, member = split_archive_path(filename)
+    if archive != None:
+        return {} #blender can only load images from files on disk
+
+    folder, name = os.path.split(filename)
+    try:
+        files = dict((f.lower(), f) for f in os.listdir(folder or '.'))
+    except OSError:
+        return {}
+
+    stem = os.path.splitext(name)[0].lower()
+    bases = (stem, re.sub(r'_lod\d+$', '', stem))
+    textures = {}
+    for kind, suffix in scm_texture_suffixes:
+        for base in bases:
+            if base + suffix in files:
+                textures[kind] = os.path.join(folder, files[base + suffix])
+                break
+    return textures
+
+def scm_material(filename):
+    # the material for the textures of the model, None if there arent any.
+    # models using the same textures (like the lods of a unit) share one material
+    textures = find_scm_textures(filename)
+    if not len(textures):
+        return None
+
+    key = "|".join(textures[kind] for kind, suffix in scm_texture_suffixes if kind in textures)
+    for material in bpy.data.materials:
+        if material.get("supcom_textures") == key:
+            return material
+
+    name = os.path.basename(list(textures.values())[0]).rsplit('_', 1)[0]
+    material = create_scm_material(name, textures)
+    material["supcom_textures"] = key
+    return material
+
+def create_scm_material(name, textures):
+    # a principled material with the textures plugged in. the images are loaded with check_existing,
+    # so every model using the same file shares one image and a batch import loads each texture once
+    material = bpy.data.materials.new(name)
+    material.use_nodes = True
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+    bsdf = [node for node in nodes if node.type == 'BSDF_PRINCIPLED'][0]
+
+    def image_node(kind, colorspace, location):
+        try:
+            image = bpy.data.images.load(textures[kind], check_existing=True)
+        except RuntimeError as error:
+            print("couldn't load", textures[kind], error)
+            return None
+        image.colorspace_settings.name = colorspace
+        node = nodes.new('ShaderNodeTexImage')
+        node.image = image
+        node.location = location
+        return node
+
+    if 'albedo' in textures:
+        albedo = image_node('albedo', 'sRGB', (-600, 300))
+        if albedo != None:
+            links.new(albedo.outputs['Color'], bsdf.inputs['Base Color'])
+
+    if 'specteam' in textures:
+        # red is the reflection, green the specular, blue the glow and alpha the team colour.
+        # only the specular has a direct match in the principled shader
+        specteam = image_node('specteam', 'Non-Color', (-800, 0))
+        specular = bsdf.inputs.get('Specular') or bsdf.inputs.get('Specular IOR Level') #renamed in blender 4.0
+        if specteam != None and specular != None:
+            separate = nodes.new('ShaderNodeSeparateRGB')
+            separate.location = (-500, 0)
+            links.new(specteam.outputs['Color'], separate.inputs[0])
+            links.new(separate.outputs[1], specular)
+
+    if 'normals' in textures:
+        # the normal maps are stored dxt5nm style, with x in the alpha and y in the green channel
+        normals = image_node('normals', 'Non-Color', (-1000, -300))
+        if normals != None:
+            separate = nodes.new('ShaderNodeSeparateRGB')
+            separate.location = (-700, -300)
+            combine = nodes.new('ShaderNodeCombineRGB')
+            combine.location = (-500, -300)
+            combine.inputs[2].default_value = 1.0
+            normalmap = nodes.new('ShaderNodeNormalMap')
+            normalmap.location = (-300, -300)
+            links.new(normals.outputs['Color'], separate.inputs[0])
+            links.new(normals.outputs['Alpha'], combine.inputs[0])
+            links.new(separate.outputs[1], combine.inputs[1])
+            links.new(combine.outputs[0], normalmap.inputs['Color'])
+            links.new(normalmap.outputs['Normal'], bsdf.inputs['Normal'])
+
+    return material
+
+def set_custom_normals(meshData, loop_normals):
+    # the normals are set for every loop at once.
+    # zero length normals stay zero, which makes blender fall back to its own normal there
+    loop_normals = loop_normals / np.maximum(np.linalg.norm(loop_normals, axis=1, keepdims=True), 1e-12)
+
+    meshData.polygons.foreach_set("use_smooth", np.ones(len(meshData.polygons), dtype=bool))
+    if hasattr(meshData, "use_auto_smooth"): #custom normals need auto smooth before blender 4.1
+        meshData.use_auto_smooth = True
+    meshData.normals_split_custom_set(loop_normals)
+
+def assign_vertex_groups(mesh, mesh_obj, vertex_indices):
     #assigns vertex groups #mesh must be in object
-    for bone in mesh.bones:
-        mesh_obj.vertex_groups.new(name=bone.name)
+    vgroups = [mesh_obj.vertex_groups.new(name=bone.name) for bone in mesh.bones]
+
+    #bucket the vertices by their bone in one pass, then add each bucket with a single call
+    vertex_bones = mesh.vertices['bone_index'][vertex_indices, 0]
+    if (vertex_bones >= len(vgroups)).any():
+        print('vertex bone index out of range, these vertices are left unassigned: ', np.unique(vertex_bones[vertex_bones >= len(vgroups)]))
+
+    vertex_order = np.argsort(vertex_bones, kind='stable')
+    bucket_sizes = np.bincount(vertex_bones, minlength=len(vgroups))
+    bucket_ends = np.cumsum(bucket_sizes)
+    bucket_starts = bucket_ends - bucket_sizes
+    for bone_index, vgroup in enumerate(vgroups):
+        if bucket_sizes[bone_index]:
+            vgroup.add(vertex_order[bucket_starts[bone_index]:bucket_ends[bone_index]].tolist(), 1.0, 'ADD')
+
+def parent_to_armature(mesh_obj, armObj):
+    # what parent_set(type="ARMATURE") does, without needing the operator context
+    mesh_obj.parent = armObj
+    mesh_obj.matrix_parent_inverse = armObj.matrix_world.inverted()
+    modifier = mesh_obj.modifiers.new(name="Armature", type='ARMATURE')
+    modifier.object = armObj
+
+def load_scm_file(filename, proxy = False, source_hash = ""):
+    # parses one scm. this doesnt touch bpy, so several files can be parsed on worker threads at once
+    mesh = scm_mesh()
+    return mesh.load(filename, scm_import_options["cache"], proxy, source_hash = source_hash, identify = scm_import_options["instance"])
 
+def load_scm_lod_file(filename):
+    # parses a lod that uses the skeleton of another file, without decoding its own
+    mesh = scm_mesh()
+    return mesh.load(filename, scm_import_options["cache"], skeleton = False, identify = scm_import_options["instance"])
 
-    for vgroup in mesh_obj.vertex_groups:
-        #print(vgroup.name, ":", vgroup.index)
-        for vertex_index in range(len(mesh.vertices)):
-            #bone index
-            vertex = mesh.vertices[vertex_index]
-            bone_index = vertex.bone_index[0]
-            boneName = mesh.bones[bone_index].name
-            if boneName == vgroup.name:
-                vgroup.add([vertex_index], 1.0, 'ADD')
+def build_scm(mesh, armature_name):
+    # creates the armature and mesh objects for a parsed scm, must run on the main thread
+    scene = bpy.context.scene
+    print( "armature ", armature_name)
 
-    meshData.update() #blender crashes when going into edit mode without these
+    ###        CREATE ARMATURE
+    armObj = create_scm_armature(mesh, armature_name, scene.collection)
+    if mesh.source_hash:
+        armObj.data["supcom_source"] = mesh.source_hash
 
-    bpy.context.view_layer.update()
+    mesh_obj = build_scm_mesh_object(mesh, armObj, scene.collection)
+    return armObj, mesh_obj
 
+def build_scm_mesh_object(mesh, armObj, collection, object_name = 'Mesh'):
+    # the mesh object of a parsed scm, skinned to the armature
+    meshData, vertex_indices = create_scm_mesh_data(mesh)
 
-    bpy.ops.object.select_all(action='DESELECT')
+    mesh_obj = bpy.data.objects.new(object_name, meshData)
+    collection.objects.link(mesh_obj)
 
-    mesh_obj.select_set(False)
-    armObj.select_set(False)
+    assign_vertex_groups(mesh, mesh_obj, vertex_indices)
+    parent_to_armature(mesh_obj, armObj)
 
-    mesh_obj.select_set(True)
-    armObj.select_set(True)
-    layer.objects.active = armObj
-    bpy.ops.object.parent_set(type="ARMATURE")
+    # marks the data with the file it came from, so later imports of the same file can reuse it
+    if mesh.source_hash:
+        meshData["supcom_source"] = scm_data_key(mesh.source_hash)
+    if len(mesh.extra_header):
+        # id properties are signed 32 bit, the words are stored with the same bits
+        meshData["supcom_extra_header"] = mesh.extra_header.astype('<u4').view('<i4').tolist()
 
     if len(mesh.info):
         print( "=== INFO ===")
         for info in mesh.info:
             print( "",info)
 
+    return mesh_obj
+
+def scm_lod_siblings(filename):
+    # (unit name, lod files sorted by lod) for a file named like uel0001_lod0.scm, the lods are looked
+    # for in the same folder or archive folder. other files are returned alone
+    folder, name = os.path.split(filename)
+    match = re.match(r'(.*)_lod(\d+)\.scm$', name, re.IGNORECASE)
+    if match == None:
+        return name.rstrip(".scm"), [filename]
+
+    archive, member = split_archive_path(filename)
+    if archive != None:
+        prefix = member.rsplit('/', 1)[0].lower() + '/' if '/' in member else ''
+        names = [entry[0].rsplit('/', 1)[-1] for key, entry in scd_index(archive).items() if key.startswith(prefix) and '/' not in key[len(prefix):]]
+    else:
+        try:
+            names = os.listdir(folder or '.')
+        except OSError:
+            names = [name]
+
+    lods = []
+    for sibling in names:
+        sibling_match = re.match(r'(.*)_lod(\d+)\.scm$', sibling, re.IGNORECASE)
+        if sibling_match != None and sibling_match.group(1).lower() == match.group(1).lower():
+            lods.append((int(sibling_match.group(2)), os.path.join(folder, sibling) if archive == None else folder + '/' + sibling))
+    return match.group(1), [path for lod, path in sorted(lods)]
+
+def read_scm_lod_sets(filenames):
+    # imports every lod of the selected units with one armature per unit. only the first lod is parsed
+    # with its skeleton, the others just check their bone names against it. each lod is put in its own
+    # collection, and all but the first are hidden
+    global globMesh
+
+    print( "=== LOADING Sup Com LOD sets ===")
+    print( "")
+    scene = bpy.context.scene
+    layer = bpy.context.view_layer
+
+    sets = []
+    seen = set()
+    for filename in filenames:
+        unit, lods = scm_lod_siblings(filename)
+        if lods[0].lower() not in seen:
+            seen.add(lods[0].lower())
+            sets.append((unit, lods))
+
+    imported = []
+    failed = []
+    with ThreadPoolExecutor(max_workers = max(1, min(sum(len(lods) for unit, lods in sets), os.cpu_count() or 1))) as pool:
+        jobs = []
+        for unit, lods in sets:
+            lod_jobs = [pool.submit(load_scm_file, lods[0])]
+            lod_jobs += [pool.submit(load_scm_lod_file, filename) for filename in lods[1:]]
+            jobs.append((unit, lods, lod_jobs))
+
+        for unit, lods, lod_jobs in jobs:
+            armObj = None
+            for lod, (filename, job) in enumerate(zip(lods, lod_jobs)):
+                name = os.path.basename(filename)
+                try:
+                    mesh = job.result()
+                except (OSError, ValueError, struct.error) as error:
+                    print( 'Failed to load %s:' %name, error)
+                    mesh = None
+                if (mesh == None):
+                    print( 'Failed to load %s' %name)
+                    failed.append(name)
+                    if lod == 0:
+                        break #without the skeleton there is nothing to attach the others to
+                    continue
+
+                if armObj == None:
+                    print( "armature ", unit)
+                    armObj = create_scm_armature(mesh, unit, scene.collection)
+                    if mesh.source_hash:
+                        armObj.data["supcom_source"] = mesh.source_hash
+                    bones = mesh.bones
+                    globMesh = mesh
+                elif mesh.bonenames != [bone.name for bone in bones]:
+                    print( 'The bones of %s dont match the first lod, it is skipped' %name)
+                    failed.append(name)
+                    continue
+                else:
+                    mesh.bones = bones
+
+                collection = bpy.data.collections.new(name.rstrip(".scm"))
+                scene.collection.children.link(collection)
+                mesh_obj = build_scm_mesh_object(mesh, armObj, collection, name.rstrip(".scm"))
+                if lod > 0:
+                    layer.layer_collection.children[collection.name].hide_viewport = True
+                imported.append((armObj, mesh_obj))
+
+    if len(imported):
+        for obj in layer.objects.selected:
+            obj.select_set(False)
+        for armObj, mesh_obj in imported:
+            armObj.select_set(True)
+            if mesh_obj.visible_get():
+                mesh_obj.select_set(True)
+        layer.objects.active = imported[-1][0]
+
+    if len(failed):
+        my_popup( 'Failed to load %s' %", ".join(failed))
+
     print( "=== COMPLETE ===")
+    return len(imported)
+
+def scm_file_hash(filename):
+    with scm_reader(filename) as scm:
+        return content_hash(scm.buffer)
+
+def scm_data_key(source_hash):
+    # the mesh data also depends on the import options that change the geometry or the material
+    return '%s_%d%d%d' % (source_hash, scm_import_options["weld"], scm_import_options["custom_normals"], scm_import_options["materials"])
+
+def find_imported_scm(source_hash):
+    # the mesh and armature data of an earlier import of the same file, None if there isnt one
+    key = scm_data_key(source_hash)
+    meshData = None
+    for data in bpy.data.meshes:
+        if data.get("supcom_source") == key:
+            meshData = data
+            break
+    if meshData == None:
+        return None
+
+    for armData in bpy.data.armatures:
+        if armData.get("supcom_source") == source_hash:
+            return meshData, armData
+    return None
+
+def instance_scm(meshData, armData, armature_name):
+    # new objects for a model that is already in the file, using its mesh and armature data.
+    # the vertex groups are kept in the mesh data, so only the parenting has to be redone
+    scene = bpy.context.scene
+    print( "armature ", armature_name, "(reusing", armData.name, meshData.name + ")")
 
+    armObj = bpy.data.objects.new(armature_name, armData)
+    scene.collection.objects.link(armObj)
+
+    mesh_obj = bpy.data.objects.new('Mesh', meshData)
+    scene.collection.objects.link(mesh_obj)
+
+    parent_to_armature(mesh_obj, armObj)
+    return armObj, mesh_obj
+
+def create_bounds_mesh_data(bounds):
+    # a box mesh from the (min, max) corners
+    low, high = bounds
+    corners = [(x, y, z) for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])]
+    meshData = bpy.data.meshes.new('Proxy')
+    meshData.from_pydata(corners, [], [(0,1,3,2), (4,6,7,5), (0,4,5,1), (2,3,7,6), (0,2,6,4), (1,5,7,3)])
+    return meshData
+
+def build_scm_proxy(mesh, armature_name):
+    # the armature and a bounding box standing in for the mesh. the box remembers the file, so
+    # load_proxy_geometry can put the real mesh in later
+    scene = bpy.context.scene
+    print( "armature ", armature_name, "(skeleton only)")
+
+    armObj = create_scm_armature(mesh, armature_name, scene.collection)
+    if mesh.source_hash:
+        armObj.data["supcom_source"] = mesh.source_hash
+
+    mesh_obj = bpy.data.objects.new('Mesh', create_bounds_mesh_data(mesh.bounds))
+    scene.collection.objects.link(mesh_obj)
+    mesh_obj.display_type = 'BOUNDS'
+    mesh_obj["supcom_proxy"] = mesh.filename
+
+    parent_to_armature(mesh_obj, armObj)
+    return armObj, mesh_obj
+
+def find_scm_proxies(objects):
+    # the proxy boxes among the objects, or parented to any of them
+    proxies = []
+    for obj in objects:
+        for candidate in (obj,) + tuple(obj.children):
+            if "supcom_proxy" in candidate and candidate not in proxies:
+                proxies.append(candidate)
+    return proxies
+
+def load_proxy_geometry(proxies):
+    # parses the files of the proxy boxes and swaps the real meshes in, with the current import options
+    print( "=== LOADING Sup Com Geometry ===")
+    failed = []
+    loaded = 0
+    with ThreadPoolExecutor(max_workers = max(1, min(len(proxies), os.cpu_count() or 1))) as pool:
+        jobs = {pool.submit(load_scm_file, mesh_obj["supcom_proxy"]): mesh_obj for mesh_obj in proxies}
+        for job in as_completed(jobs):
+            mesh_obj = jobs[job]
+            name = os.path.basename(mesh_obj["supcom_proxy"])
+            try:
+                mesh = job.result()
+            except (OSError, ValueError, struct.error) as error:
+                print( 'Failed to load %s:' %name, error)
+                mesh = None
+            if (mesh == None):
+                print( 'Failed to load %s' %name)
+                failed.append(name)
+                continue
+
+            meshData, vertex_indices = create_scm_mesh_data(mesh)
+            if mesh.source_hash:
+                meshData["supcom_source"] = scm_data_key(mesh.source_hash)
+
+            proxyData = mesh_obj.data
+            mesh_obj.data = meshData
+            if proxyData.users == 0:
+                bpy.data.meshes.remove(proxyData)
+
+            mesh_obj.vertex_groups.clear()
+            assign_vertex_groups(mesh, mesh_obj, vertex_indices)
+            mesh_obj.display_type = 'TEXTURED'
+            del mesh_obj["supcom_proxy"]
+            loaded += 1
+
+    if len(failed):
+        my_popup( 'Failed to load %s' %", ".join(failed))
+
+    print( "=== COMPLETE ===")
+    return loaded
+
+def read_scm() :
+    global scm_filepath # [0] both [1] path [2] name
+    read_scm_files([scm_filepath[0]])
+
+def read_scm_files(filenames) :
+    # the files are parsed on a thread pool, the numpy decoding releases the gil for the big sections.
+    # blender data can only be made on the main thread, so each model is built there as soon as its parse is done
     global globMesh
-    globMesh = mesh
+
+    print( "=== LOADING Sup Com Model ===")
+    print( "")
+    layer = bpy.context.view_layer
+
+    imported = []
+    failed = []
+
+    # with instancing, models that are already in the file are linked again instead of parsed,
+    # and a model selected several times is only parsed once
+    parse = filenames
+    copies = {}
+    hashes = {}
+    if scm_import_options["instance"]:
+        parse = []
+        first_of = {}
+        for filename in filenames:
+            try:
+                source_hash = scm_file_hash(filename)
+            except (OSError, ValueError, struct.error):
+                parse.append(filename) #the parse reports the error
+                continue
+
+            data = find_imported_scm(source_hash)
+            if data != None:
+                imported.append(instance_scm(data[0], data[1], os.path.basename(filename).rstrip(".scm")))
+            elif source_hash in first_of:
+                copies[first_of[source_hash]].append(filename)
+            else:
+                first_of[source_hash] = filename
+                copies[filename] = []
+                hashes[filename] = source_hash
+                parse.append(filename)
+
+    with ThreadPoolExecutor(max_workers = max(1, min(len(parse), os.cpu_count() or 1))) as pool:
+        jobs = {pool.submit(load_scm_file, filename, scm_import_options["proxy"], hashes.get(filename, "")): filename for filename in parse}
+        for job in as_completed(jobs):
+            filename = jobs[job]
+            name = os.path.basename(filename)
+            try:
+                mesh = job.result()
+            except (OSError, ValueError, struct.error) as error:
+                print( 'Failed to load %s:' %name, error)
+                mesh = None
+            if (mesh == None):
+                print( 'Failed to load %s' %name)
+                failed.append(name)
+                continue
+
+            #ProgBarLSCM = ProgressBar( "Imp: load SCM", (2*len(mesh.vertices) + len(mesh.faces)))
+
+            if scm_import_options["proxy"]:
+                armObj, mesh_obj = build_scm_proxy(mesh, name.rstrip(".scm"))
+            else:
+                armObj, mesh_obj = build_scm(mesh, name.rstrip(".scm"))
+            imported.append((armObj, mesh_obj))
+            globMesh = mesh
+
+            for copy in copies.get(filename, []):
+                copyArmObj, copyMeshObj = instance_scm(mesh_obj.data, armObj.data, os.path.basename(copy).rstrip(".scm"))
+                if scm_import_options["proxy"]:
+                    copyMeshObj.display_type = 'BOUNDS'
+                    copyMeshObj["supcom_proxy"] = copy
+                imported.append((copyArmObj, copyMeshObj))
+
+    if len(imported):
+        for obj in layer.objects.selected:
+            obj.select_set(False)
+        for armObj, mesh_obj in imported:
+            mesh_obj.select_set(True)
+            armObj.select_set(True)
+        layer.objects.active = imported[-1][0]
+
+    if len(failed):
+        my_popup( 'Failed to load %s' %", ".join(failed))
+
+    print( "=== COMPLETE ===")
+    return len(imported)
     
 
 def iterate_bones(meshBones, bone, parent = None, scm_parent_index = -1):
@@ -903,25 +2071,30 @@ def iterate_bones(meshBones, bone, parent = None, scm_parent_index = -1):
         for child in bone.children:
             iterate_bones( meshBones, child, bone, b_index )
 
-def get_mesh_bones():
+# the rest bones are kept per armature for the session, and only rebuilt when its bones change
+rest_pose_cache = {}
+
+def find_anim_armature():
     scene = bpy.context.scene
 
     # Get Selected object(s)
     selected_objects = bpy.context.selected_objects
 
     # Priority to selected armature
-    arm_obj = None
     for obj in selected_objects:
         if obj.type == "ARMATURE":
-            arm_obj = obj
-            break
+            return obj
 
     # Is there one armature? Take this one
-    if arm_obj == None :
-        for obj in scene.objects: #possibly change to layer.objects
-            if obj.type == "ARMATURE":
-                arm_obj = obj
-                break
+    for obj in scene.objects: #possibly change to layer.objects
+        if obj.type == "ARMATURE":
+            return obj
+
+    return None
+
+def get_mesh_bones(arm_obj = None):
+    if arm_obj == None:
+        arm_obj = find_anim_armature()
 
     if arm_obj == None:
         popup("Error: Please select your armature.%t|OK")
@@ -930,6 +2103,14 @@ def get_mesh_bones():
     MArmatureWorld = Matrix(arm_obj.matrix_world)
     
     arm = arm_obj.data
+
+    bone_matrices = np.zeros(len(arm.bones) * 16, dtype=np.float32)
+    arm.bones.foreach_get("matrix_local", bone_matrices)
+    signature = (arm.name, tuple(arm.bones.keys()), tuple(bone.parent.name if bone.parent else "" for bone in arm.bones), bone_matrices.tobytes())
+    cached = rest_pose_cache.get(arm_obj.name)
+    if cached != None and cached[0] == signature:
+        return cached[1]
+
     meshBones = []
     for bone in arm.bones.values():
         if (bone.parent == None):
@@ -960,6 +2141,8 @@ def get_mesh_bones():
     #    print ("inv",b.rel_matrix_inv)
     #    print ("inv0",b.rel_mat_inv)
     
+    meshBones = rest_bone_list(meshBones)
+    rest_pose_cache[arm_obj.name] = (signature, meshBones)
     return meshBones
 
 def read_anim(mesh):
@@ -987,7 +2170,9 @@ def read_anim(mesh):
     print( "")
 
     anim = sca_anim()
-    anim.load(sca_filepath[0])
+    if (anim.load(sca_filepath[0], frames=False) == None):
+        my_popup('Not a valid .sca animation file')
+        return
     
     meshBones = get_mesh_bones()
     
@@ -1025,20 +2210,166 @@ def check_bone(meshBones,anim,objBoneNames,bone_num):
     else:
         return read_end_anim(meshBones,anim)
 
+def add_fcurve_keys(action, data_path, index, group, frames, values, interpolation = 'LINEAR'):
+    # creates the f-curve and fills all of its keys in one go, instead of a keyframe_insert per frame
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+
+    co = np.empty((len(frames), 2), dtype=np.float32)
+    co[:, 0] = frames
+    co[:, 1] = values
+
+    interpolation_value = bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[interpolation].value
+
+    fcurve.keyframe_points.add(len(frames))
+    fcurve.keyframe_points.foreach_set("co", co.ravel())
+    fcurve.keyframe_points.foreach_set("interpolation", np.full(len(frames), interpolation_value, dtype=np.int32))
+    fcurve.update()
+    return fcurve
+
+def make_quaternions_continuous(quats, previous = None):
+    # q and -q are the same rotation, flip the signs so each key stays in the hemisphere of the previous one.
+    # otherwise interpolating between two keys can take the long way around.
+    # the signs are flipped in place. previous is the key before the first one, when the frames come in chunks
+    if previous is None:
+        first = np.zeros(quats.shape[1:-1], dtype=bool)
+    else:
+        first = np.sum(quats[0] * previous, axis=-1) < 0
+    flips = np.sum(quats[1:] * quats[:-1], axis=-1) < 0
+    parity = np.concatenate((first[None], first ^ (np.cumsum(flips, axis=0) % 2 == 1)))
+    quats[parity] *= -1
+    return quats
+
+def decimate_keys(values, tolerance):
+    # values is frames x groups x components. Returns a frames x groups mask of the keys to keep, such that
+    # linear interpolation between the kept keys rebuilds every frame of a group within tolerance,
+    # measured as the distance between the interpolated and the real values.
+    # Keys are refined like Douglas-Peucker, but every segment of every group is handled in the same pass.
+    numframes, numgroups = values.shape[:2]
+    keep = np.zeros((numframes, numgroups), dtype=bool)
+    if numframes == 0:
+        return keep
+    keep[0] = True
+    keep[-1] = True
+
+    frame_index = np.broadcast_to(np.arange(numframes)[:, None], keep.shape)
+    groups = np.arange(numgroups)[None, :]
+    while True:
+        # the kept keys on either side of each frame
+        prev_key = np.maximum.accumulate(np.where(keep, frame_index, 0), axis=0)
+        next_key = np.minimum.accumulate(np.where(keep, frame_index, numframes - 1)[::-1], axis=0)[::-1]
+
+        t = ((frame_index - prev_key) / np.maximum(next_key - prev_key, 1))[..., None]
+        prev_values = values[prev_key, groups]
+        interpolated = prev_values + (values[next_key, groups] - prev_values) * t
+        error = np.linalg.norm(interpolated - values, axis=-1)
+        error[keep] = 0.0
+
+        # in every segment that is still off, keep the frame that is furthest off
+        segment = prev_key * numgroups + groups
+        segment_error = np.zeros(numframes * numgroups)
+        np.maximum.at(segment_error, segment.ravel(), error.ravel())
+        add = (error > tolerance) & (error == segment_error[segment])
+        if not add.any():
+            return keep
+        keep |= add
+
+def calc_anim_pose(anim, meshBones, cache = False):
+    # the pose location and rotation of every animation bone on every frame. this only uses numpy,
+    # so it can run on a worker thread
+    
+    # the rest pose of the mesh bone matching each animation bone
+    rest_matrix_inv = meshBones.matrix_inv_table(anim.bonenames)
+
+    if cache:
+        # the pose depends on the armature too, so its rest pose is part of the key
+        with sca_reader(anim.filename) as sca:
+            key = parse_cache_key('sca', content_hash(sca.buffer, rest_matrix_inv.tobytes(), np.array(anim.bonelinks, dtype=np.int32).tobytes()))
+        arrays = parse_cache_load(key)
+        if arrays != None:
+            print("using the cached data of", anim.filename)
+            return arrays['pose_pos'], arrays['pose_rot']
+
+    # the frames are streamed from the file in chunks, so only one chunk of the file is decoded at a time.
+    # the converted pose is still kept for the whole animation (7 floats per bone and frame): the f-curves
+    # are filled per channel with foreach_set, and key reduction and the cache need whole channels too,
+    # so the peak memory grows with the length of the animation
+    pose_pos = np.zeros((anim.numframes, anim.numbones, 3), dtype=np.float32)
+    pose_rot = np.zeros((anim.numframes, anim.numbones, 4), dtype=np.float32)
+    for start, keytimes, keyflags, posrot in anim.iter_frames():
+        # this changes the relative orientation (supcom) to absolute orientation (blender), for the whole chunk at once
+        end = start + len(posrot)
+        pose_pos[start:end], pose_rot[start:end] = anim.calcAnimPoseArrays(posrot, rest_matrix_inv)
+        make_quaternions_continuous(pose_rot[start:end], pose_rot[start - 1] if start else None)
+    if cache:
+        parse_cache_store(key, {'pose_pos': pose_pos, 'pose_rot': pose_rot})
+
+    return pose_pos, pose_rot
+
+def create_anim_action(arm_obj, anim, pose_pos, pose_rot, action_name):
+    # makes a new action with the keys of the animation, without assigning it to the armature.
+    # returns the action and the names of the animation bones that the armature doesnt have
+    action = bpy.data.actions.new(name=action_name)
+    pose = arm_obj.pose
+    missing = []
+
+    pose_scale = np.ones((anim.numframes, 3), dtype=np.float32)
+
+    # the keys are written straight into the f-curves of the action, one key per frame starting at frame 1
+    frames = np.arange(1, anim.numframes + 1, dtype=np.float32)
+
+    decimate = sca_import_options["decimate"]
+    if decimate:
+        keep_pos = decimate_keys(pose_pos, sca_import_options["location_tolerance"])
+        # the angle between two close unit quaternions is about twice the length of their difference
+        keep_rot = decimate_keys(pose_rot, sca_import_options["rotation_tolerance"] / 2)
+        print("keys kept: location %d of %d, rotation %d of %d" % (keep_pos.sum(), keep_pos.size, keep_rot.sum(), keep_rot.size))
+
+    # replacing bones can map two animation bones onto the same armature bone, the last one is keyed
+    last_of = {bone_name: b for b, bone_name in enumerate(anim.bonenames)}
+
+    # this inserts the bones information into blender.
+    for b in range(anim.numbones):
+        bone_name = anim.bonenames[b]
+        if (bone_name == "_importer_Discard_"):
+            continue
+        if last_of[bone_name] != b:
+            continue
+
+        print("bone",bone_name)
+        if (pose.bones.get(bone_name) == None):
+            print( 'Bone \"%s\" not found' % bone_name)
+            missing.append(bone_name)
+            continue
+
+        data_path = 'pose.bones["%s"].' % bpy.utils.escape_identifier(bone_name)
+        if decimate:
+            # supcom animations have no scale, so it is left at (1,1,1) instead of being keyed
+            pose.bones[bone_name].scale = (1.0, 1.0, 1.0)
+            channels = (("location", pose_pos[:, b], keep_pos[:, b]), ("rotation_quaternion", pose_rot[:, b], keep_rot[:, b]))
+        else:
+            channels = (("location", pose_pos[:, b], None), ("rotation_quaternion", pose_rot[:, b], None), ("scale", pose_scale, None))
+
+        for channel, values, keep in channels:
+            if keep is not None:
+                channel_frames, values = frames[keep], values[keep]
+            else:
+                channel_frames = frames
+            for index in range(values.shape[1]):
+                add_fcurve_keys(action, data_path + channel, index, bone_name, channel_frames, values[:, index])
+
+    return action, missing
+
 def read_end_anim(meshBones,anim):
     global xy_to_xz_transform
     global sca_filepath # [0] both [1] path [2] name
-    #ProgBarLSCA = ProgressBar( "Imp: Frames", len(anim.frames))
+    #ProgBarLSCA = ProgressBar( "Imp: Frames", anim.numframes)
     
     
     scene = bpy.context.scene
     context = bpy.context
 
-    arm_obj = None
-    for obj in scene.objects: #possibly change to layer.objects
-        if obj.type == "ARMATURE":
-            arm_obj = obj
-            break
+    # the same armature get_mesh_bones took the rest pose from
+    arm_obj = find_anim_armature()
 
     if arm_obj == None:
         print( "couldn't apply animation, no armature in the scene" )
@@ -1046,51 +2377,92 @@ def read_end_anim(meshBones,anim):
         return
 
     print( arm_obj.name)
+    pose_pos, pose_rot = calc_anim_pose(anim, meshBones, sca_import_options["cache"])
+
     arm_obj.animation_data_clear()
     arm_obj.animation_data_create()
-    action = bpy.data.actions.new(name=sca_filepath[2].rstrip(".sca"))
+    action, missing = create_anim_action(arm_obj, anim, pose_pos, pose_rot, sca_filepath[2].rstrip(".sca"))
     arm_obj.animation_data.action = action
 
-    pose = arm_obj.pose
-
-    for frame_index in range(len(anim.frames)):
+    for bone_name in missing:
+        my_popup_warn( 'Bone \"%s\" not found' % bone_name)
 
-        context.scene.frame_set(frame_index + 1)
-        frame = anim.frames[frame_index]
-
-        # this inserts the bones information into blender.
-        for b in range(len(frame.bones)):
-            if (anim.bonenames[b] != "_importer_Discard_"):
-                if (frame_index == 0):
-                    print("bone",anim.bonenames[b])
-                
-                pose_bone = pose.bones[anim.bonenames[b]]
-
-                # this changes the relative orientation (supcom) to absolute orientation (blender)
-                frame.bones[b].name = anim.bonenames[b]
-                anim.calcAnimBoneMatrix(frame, b, meshBones, frame_index)
+    context.scene.frame_set(1)
 
-                if (pose_bone == None):
-                    print( 'Frame %d - Bone \"%s\" not found' % (frame_index, anim.bonenames[b]))
-                    my_popup_warn( 'Frame %d - Bone \"%s\" not found' % (frame_index, anim.bonenames[b]))
-                    continue
+    context.scene.frame_end = anim.numframes
+    bpy.context.view_layer.update()
 
-                anim_bone = frame.bones[b]
+    print( "=== COMPLETE ===")
 
-                pose_bone.location = anim_bone.pose_pos
-                pose_bone.rotation_quaternion = anim_bone.pose_rot
-                pose_bone.scale = Vector((1,1,1))
+def load_anim_pose(filename, meshBones):
+    # parses one sca and converts its frames to pose values, runs on a worker thread
+    anim = sca_anim()
+    if (anim.load(filename, frames=False) == None):
+        return None
+    pose_pos, pose_rot = calc_anim_pose(anim, meshBones, sca_import_options["cache"])
+    return anim, pose_pos, pose_rot
+
+def read_anim_files(filenames):
+    # imports every file as its own action, each in its own nla track of the armature. the current action is kept.
+    # the rest pose is worked out once for all of them, and the files are decoded on a thread pool while the
+    # actions of the finished ones are made on the main thread
+    print( "=== LOADING Sup Com Animations ===")
+    print( "")
+    context = bpy.context
 
-                pose_bone.keyframe_insert("location")
-                pose_bone.keyframe_insert("rotation_quaternion")
-                pose_bone.keyframe_insert("scale")
+    arm_obj = find_anim_armature()
+    if arm_obj == None:
+        print( "couldn't apply animation, no armature in the scene" )
+        my_popup("couldn't apply animation, no armature in the scene")
+        return
 
-    context.scene.frame_set(1)
+    meshBones = get_mesh_bones(arm_obj)
+    if meshBones == None:
+        return
 
-    context.scene.frame_end = len(anim.frames)
-    bpy.context.view_layer.update()
+    print( arm_obj.name)
+    if arm_obj.animation_data == None:
+        arm_obj.animation_data_create()
+
+    imported = []
+    failed = []
+    missing = []
+    with ThreadPoolExecutor(max_workers = max(1, min(len(filenames), os.cpu_count() or 1))) as pool:
+        jobs = [pool.submit(load_anim_pose, filename, meshBones) for filename in filenames]
+        # the tracks are made in the order the files were given, the later files keep decoding meanwhile
+        for filename, job in zip(filenames, jobs):
+            name = os.path.basename(filename)
+            try:
+                result = job.result()
+            except (OSError, ValueError, struct.error) as error:
+                print( 'Failed to load %s:' %name, error)
+                result = None
+            if (result == None):
+                print( 'Failed to load %s' %name)
+                failed.append(name)
+                continue
+
+            anim, pose_pos, pose_rot = result
+            action, action_missing = create_anim_action(arm_obj, anim, pose_pos, pose_rot, name.rstrip(".sca"))
+            missing += [bone_name for bone_name in action_missing if bone_name not in missing]
+
+            track = arm_obj.animation_data.nla_tracks.new()
+            track.name = action.name
+            track.strips.new(action.name, 1, action)
+            imported.append(anim)
+
+    if len(imported):
+        context.scene.frame_set(1)
+        context.scene.frame_end = max(anim.numframes for anim in imported)
+        bpy.context.view_layer.update()
+
+    if len(missing):
+        my_popup_warn( 'Bones not found: %s' % ", ".join(missing))
+    if len(failed):
+        my_popup( 'Failed to load %s' %", ".join(failed))
 
     print( "=== COMPLETE ===")
+    return len(imported)
 
 class IMPORT_OT_scm(bpy.types.Operator):
     '''Load a skeleton mesh psk File'''
@@ -1107,16 +2479,103 @@ class IMPORT_OT_scm(bpy.types.Operator):
             subtype='FILE_PATH',
             )
     filter_glob : StringProperty(
-            default="*.scm",
+            default="*.scm;*.scd",
             options={'HIDDEN'},
             )
+    files : CollectionProperty(
+            type=bpy.types.OperatorFileListElement,
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+    directory : StringProperty(
+            subtype='DIR_PATH',
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+
+    archive_pattern : StringProperty(
+            name="Archive Files",
+            description="Which files to import from a selected .scd archive, as a wildcard pattern. Patterns with a / are matched against the whole path in the archive, for instance units/uel0001/*_lod0.scm",
+            default="",
+            )
+
+    use_cache : BoolProperty(
+            name="Cache Parsed Data",
+            description="Keep the decoded data on disk, so importing the same file again skips the parsing",
+            default=False,
+            )
+
+    import_materials : BoolProperty(
+            name="Import Materials",
+            description="Make a material from the _Albedo, _SpecTeam and _NormalsTS textures next to the file",
+            default=True,
+            )
+
+    lod_set : BoolProperty(
+            name="Import LOD Set",
+            description="Also import the other _lod files of the unit, all using one armature. Each lod is put in its own collection and only the first is shown",
+            default=False,
+            )
+
+    skeleton_only : BoolProperty(
+            name="Skeleton Only",
+            description="Import the armature with a bounding box in place of the mesh. The mesh can be loaded later with Object > Load SupCom Geometry",
+            default=False,
+            )
+
+    reuse_data : BoolProperty(
+            name="Reuse Imported Models",
+            description="Link new objects to the mesh and armature of a model that was already imported from the same file, instead of importing it again",
+            default=False,
+            )
+
+    use_custom_normals : BoolProperty(
+            name="Import Normals",
+            description="Use the normals stored in the file as custom split normals, so hard edges are kept",
+            default=True,
+            )
+
+    weld_vertices : BoolProperty(
+            name="Weld Vertices",
+            description="Merge vertices that share a position and a bone, and mark the edges where the normals were split as sharp",
+            default=False,
+            )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "use_custom_normals")
+        layout.prop(self, "weld_vertices")
+        layout.prop(self, "import_materials")
+        layout.prop(self, "use_cache")
+        layout.prop(self, "reuse_data")
+        layout.prop(self, "lod_set")
+        layout.prop(self, "skeleton_only")
+        draw_archive_pattern(layout, self, ".scm")
+        draw_file_stats(layout, self.filepath)
 
     def execute(self, context):
-        scm_filepath[0] = self.filepath
-        length = len(self.filepath)
-        if self.filepath[length-4:length] == ".scm" :
-            scm_filepath[1], scm_filepath[2]  = os.path.split(self.filepath)
-            read_scm()
+        find_cache_root()
+        scm_import_options["custom_normals"] = self.use_custom_normals
+        scm_import_options["weld"] = self.weld_vertices
+        scm_import_options["materials"] = self.import_materials
+        scm_import_options["cache"] = self.use_cache
+        scm_import_options["instance"] = self.reuse_data
+        scm_import_options["proxy"] = self.skeleton_only
+        scm_import_options["lods"] = self.lod_set and not self.skeleton_only
+
+        #several files can be selected in the file browser, without any the single filepath is used
+        filenames = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+        if not len(filenames):
+            filenames = [self.filepath]
+        #selected scd archives are replaced by the files in them that match the archive pattern
+        filenames = expand_archive_files(filenames, self.archive_pattern, ".scm")
+        filenames = [filename for filename in filenames if filename[-4:].lower() == ".scm"]
+
+        if len(filenames):
+            scm_filepath[0] = filenames[-1]
+            scm_filepath[1], scm_filepath[2]  = os.path.split(filenames[-1])
+            if scm_import_options["lods"]:
+                read_scm_lod_sets(filenames)
+            else:
+                read_scm_files(filenames)
             return {'FINISHED'}
             
         else:
@@ -1141,15 +2600,80 @@ class IMPORT_OT_sca(bpy.types.Operator):
             subtype='FILE_PATH',
             )
     filter_glob : StringProperty(
-            default="*.sca",
+            default="*.sca;*.scd",
             options={'HIDDEN'},
             )
+    files : CollectionProperty(
+            type=bpy.types.OperatorFileListElement,
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+    directory : StringProperty(
+            subtype='DIR_PATH',
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+
+    archive_pattern : StringProperty(
+            name="Archive Files",
+            description="Which files to import from a selected .scd archive, as a wildcard pattern. Patterns with a / are matched against the whole path in the archive, for instance units/uel0001/*.sca",
+            default="",
+            )
+
+    use_cache : BoolProperty(
+            name="Cache Parsed Data",
+            description="Keep the decoded data on disk, so importing the same file again skips the parsing",
+            default=False,
+            )
+
+    decimate : BoolProperty(
+            name="Reduce Keyframes",
+            description="Remove keys that interpolation can rebuild within the tolerances below, and dont key the unused scale",
+            default=False,
+            )
+    location_tolerance : FloatProperty(
+            name="Location Tolerance",
+            description="Largest location error allowed when removing keys",
+            default=0.001, min=0.0, precision=4,
+            )
+    rotation_tolerance : FloatProperty(
+            name="Rotation Tolerance",
+            description="Largest rotation error allowed when removing keys",
+            default=radians(0.1), min=0.0, subtype='ANGLE',
+            )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "decimate")
+        col = layout.column()
+        col.enabled = self.decimate
+        col.prop(self, "location_tolerance")
+        col.prop(self, "rotation_tolerance")
+        layout.prop(self, "use_cache")
+        draw_archive_pattern(layout, self, ".sca")
+        draw_file_stats(layout, self.filepath)
 
     def execute(self, context):
-        sca_filepath[0] = self.filepath
-        length = len(self.filepath)
-        if self.filepath[length-4:length] == ".sca" :
-            sca_filepath[1], sca_filepath[2]  = os.path.split(self.filepath)
+        find_cache_root()
+        sca_import_options["decimate"] = self.decimate
+        sca_import_options["location_tolerance"] = self.location_tolerance
+        sca_import_options["rotation_tolerance"] = self.rotation_tolerance
+        sca_import_options["cache"] = self.use_cache
+
+        #with several files selected each one goes into its own nla track instead of replacing the action
+        filenames = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+        if not len(filenames):
+            filenames = [self.filepath]
+        #selected scd archives are replaced by the files in them that match the archive pattern
+        filenames = expand_archive_files(filenames, self.archive_pattern, ".sca")
+        filenames = [filename for filename in filenames if filename[-4:].lower() == ".sca"]
+        if len(filenames) > 1:
+            sca_filepath[0] = filenames[-1]
+            sca_filepath[1], sca_filepath[2]  = os.path.split(filenames[-1])
+            read_anim_files(filenames)
+            return {'FINISHED'}
+
+        if len(filenames):
+            sca_filepath[0] = filenames[0]
+            sca_filepath[1], sca_filepath[2]  = os.path.split(filenames[0])
             global globMesh
             read_anim(globMesh)
         else:
@@ -1164,6 +2688,22 @@ class IMPORT_OT_sca(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
 
+class OBJECT_OT_scm_load_geometry(bpy.types.Operator):
+    '''Replace the bounding boxes of skeleton only SCM imports with the meshes from their files'''
+    bl_idname = "object.scm_load_geometry"
+    bl_label = "Load SupCom Geometry"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return len(find_scm_proxies(context.selected_objects)) > 0
+
+    def execute(self, context):
+        find_cache_root()
+        load_proxy_geometry(find_scm_proxies(context.selected_objects))
+        return {'FINISHED'}
+
+
 def menu_func(self, context):
     self.layout.operator(IMPORT_OT_scm.bl_idname, text="Supcom Mesh (.scm)")
     self.layout.operator(IMPORT_OT_sca.bl_idname, text="Supcom Anim (.sca)")
@@ -1173,14 +2713,20 @@ classes = (
     IMPORT_OT_sca,
     IMPORT_OT_scm,
     OBJECT_OT_anim_replace_bone,
+    OBJECT_OT_scm_load_geometry,
 )
 
+def object_menu_func(self, context):
+    self.layout.operator(OBJECT_OT_scm_load_geometry.bl_idname)
+
 def import_scm_button(self, context):
     self.layout.operator(IMPORT_OT_scm.bl_idname, text="Import SupCom Mesh", icon='TEXTURE')
 
 def register():
+    find_cache_root() #the file browser reads archive indexes before any import runs
     bpy.types.TOPBAR_MT_file_import.append(menu_func)
     bpy.types.VIEW3D_MT_image_add.append(menu_func)
+    bpy.types.VIEW3D_MT_object.append(object_menu_func)
     for cls in classes:
         #make_annotations(cls) # what is this? Read the section on annotations above!
         bpy.utils.register_class(cls)
@@ -1188,6 +2734,7 @@ def register():
 def unregister():  # note how unregistering is done in reverse
     bpy.types.TOPBAR_MT_file_import.remove(menu_func)
     bpy.types.VIEW3D_MT_image_add.remove(menu_func)
+    bpy.types.VIEW3D_MT_object.remove(object_menu_func)
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
 